@@ -1,7 +1,25 @@
-import streamlit as st
-from downloader import get_netpublicator_pdf_filenames, get_folder_depth, get_indent_for_depth
 import time
+_import_start = time.time()
+import streamlit as st
+from downloader import (get_netpublicator_pdf_filenames, get_indexed_pdf_filenames, expand_netpublicator_folder, get_folder_depth,
+                        get_indent_for_depth, get_document_hash, prespawn_driver, record_startup_phase, get_startup_timings)
+from download_script import generate_download_script
+from distributed_crawl import crawl_distributed
+from prefetch import prefetch_file_metadata, summarize_by_folder, format_size, load_metadata_cache, save_metadata_cache
+from verified_download import download_files, load_manifest, evict_documents, archive_name, DOCUMENT_STORE_DIR
+from search_index import FilenameIndex, load_content_index, save_content_index, update_content_index
+from catalog import build_catalog, extend_catalog, filter_catalog, facet_counts, date_bounds, record_catalog
+from exporter import export_to_bytes
+from profiler import profile
+from progress import run_with_progress, format_snapshot
+from path_index import index_stats
+from mirror import get_mirror
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
+_import_time = time.time() - _import_start
 
 def create_clickable_breadcrumb(breadcrumb_links, current_url):
     """Create clickable breadcrumb with proper URLs"""
@@ -23,19 +41,38 @@ def create_clickable_breadcrumb(breadcrumb_links, current_url):
     
     return breadcrumb_html
 
+@st.cache_resource
+def boot():
+    """Runs once per server process: record import time and start a browser for the first search"""
+    record_startup_phase("app_imports", _import_time)
+    # Searches are answered from disk in mirror mode, so no browser is needed
+    if get_app_mirror() is None:
+        prespawn_driver()
+    return time.time()
+
 def main():
+    boot_time = boot()
     st.title("Region Dalarna PDF Downloader")
     st.markdown("Generate JavaScript code to download PDFs directly in your browser with subfolder support")
     
     st.markdown("On this website you can find Region Dalarna's meeting documents and political protocols: https://www.netpublicator.com/reader/r90521909")
+    
+    mirror = get_app_mirror()
+    if mirror is not None:
+        mirror_roots = mirror.roots()
+        if mirror_roots:
+            last_sync = max(settings['synced_at'] for settings in mirror_roots.values())
+            st.info(f"📀 Searches are answered from a local mirror of {len(mirror_roots)} folder(s), last synced {time.strftime('%Y-%m-%d %H:%M', time.localtime(last_sync))}.")
+        else:
+            st.warning("📀 Mirror mode is on, but nothing has been synced yet. Run: python mirror.py sync URL")
       # Progress tracking
     if 'progress_placeholder' not in st.session_state:
         st.session_state.progress_placeholder = None
     
-    def progress_callback(current, total, message):
+    def render_progress(snapshot):
+        # Runs on the script thread; the crawl only drops snapshots into a queue and never waits for this
         if st.session_state.progress_placeholder:
-            progress = current / total if total > 0 else 0
-            st.session_state.progress_placeholder.progress(progress, text=message)
+            st.session_state.progress_placeholder.progress(min(1.0, snapshot.fraction), text=format_snapshot(snapshot))
     
     # Step 1: URL input and search options
     with st.form("search_form"):
@@ -51,7 +88,34 @@ def main():
             index=0,
             help="0 = Current folder only, 1+ = Include subfolders to that depth"
             )   
+            lazy_tree = st.checkbox(
+                "Expand subfolders on demand",
+                value=False,
+                help="Only scan this folder now. Subfolders get an expand button that scans just that folder in the background."
+            )
 
+        with col2:
+            crawl_workers = st.selectbox(
+                "Parallel browsers:",
+                options=[1, 2, 3, 4],
+                index=0,
+                help="Scan several subfolders at the same time with separate browsers. Only used when searching subfolders."
+            )
+            use_path_index = st.checkbox(
+                "Jump to dated folders via path index",
+                value=False,
+                help="Search only the folders whose dates fall in the date interval below, found through folders known from earlier searches instead of scanning every folder on the way. The search depth then counts from each of those folders."
+            )
+        
+        # Jump straight to a known folder
+        folder_path = st.text_input(
+            "Jump to folder path (optional):",
+            placeholder="e.g., Regionfullmäktige/År 2024/2024-06-12",
+            help="Search only this folder below the URL (and the search depth below it). Folders known from earlier searches are opened directly."
+        )
+        indexed_folders, _ = index_stats()
+        if indexed_folders:
+            st.caption(f"Path index: {indexed_folders} folders known from earlier searches")
         
         # Add folder exclusion filter
         exclude_folders = st.text_input(
@@ -108,6 +172,10 @@ def main():
         search_start_time = time.time()
         
         try:
+            # Lazy tree mode scans the root only, subfolders are scanned when expanded
+            if lazy_tree:
+                search_depth = 0
+            
             # Use search_depth to determine whether to include subfolders
             include_subfolders = search_depth > 0
             
@@ -130,18 +198,54 @@ def main():
             search_delay = speed_delays.get(speed_setting, 0.7)
             
             with st.spinner("Searching for files..."):
-                result = get_netpublicator_pdf_filenames(
-                    url, 
-                    include_subfolders=include_subfolders,
-                    search_depth=search_depth,
-                    exclude_folders=exclusion_list,
-                    date_filter=(earliest_date, latest_date),
-                    search_delay=search_delay,  # Add this parameter
-                    progress_callback=progress_callback
-                )
+                if mirror is not None:
+                    # In mirror mode only the scheduled sync contacts netpublicator.com
+                    result = mirror.search(
+                        url,
+                        search_depth=search_depth,
+                        exclude_folders=exclusion_list,
+                        date_filter=(earliest_date, latest_date),
+                        folder_path=folder_path.strip()
+                    )
+                    if result is None:
+                        st.error("This URL is not in the local mirror. Add it with: python mirror.py sync URL")
+                        st.session_state.progress_placeholder.empty()
+                        st.stop()
+                elif folder_path.strip() or use_path_index:
+                    result = run_with_progress(lambda sink: get_indexed_pdf_filenames(
+                        url,
+                        folder_path=folder_path.strip(),
+                        search_depth=search_depth,
+                        exclude_folders=exclusion_list,
+                        date_filter=(earliest_date, latest_date),
+                        search_delay=search_delay,
+                        progress_sinks=[sink]
+                    ), render_progress)
+                elif include_subfolders and crawl_workers > 1:
+                    result = run_with_progress(lambda sink: crawl_distributed(
+                        url,
+                        search_depth=search_depth,
+                        exclude_folders=exclusion_list,
+                        date_filter=(earliest_date, latest_date),
+                        search_delay=search_delay,
+                        workers=crawl_workers,
+                        progress_sinks=[sink]
+                    ), render_progress)
+                else:
+                    result = run_with_progress(lambda sink: get_netpublicator_pdf_filenames(
+                        url, 
+                        include_subfolders=include_subfolders,
+                        search_depth=search_depth,
+                        exclude_folders=exclusion_list,
+                        date_filter=(earliest_date, latest_date),
+                        search_delay=search_delay,  # Add this parameter
+                        progress_sinks=[sink]
+                    ), render_progress)
                 
                 # Calculate total time
                 total_time = time.time() - search_start_time
+                if "boot_to_first_result" not in get_startup_timings():
+                    record_startup_phase("boot_to_first_result", time.time() - boot_time)
                 
                 # Handle dictionary return format
                 if isinstance(result, dict):
@@ -180,6 +284,14 @@ def main():
             st.session_state.excluded_folders = excluded_folders
             st.session_state.excluded_folder_urls = excluded_folder_urls
             st.session_state.search_depth = search_depth
+            st.session_state.lazy_tree = lazy_tree
+            st.session_state.expanded_folders = set()
+            st.session_state.pending_expansions = {}
+            st.session_state.search_settings = {
+                'exclude_folders': exclusion_list,
+                'date_filter': (earliest_date, latest_date),
+                'search_delay': search_delay
+            }
             
             # Create file links mapping and location mapping
             st.session_state.filelinks = {fname: furl for fname, furl, _ in files}
@@ -187,6 +299,18 @@ def main():
             
             # Extract filenames for backward compatibility
             st.session_state.filenames = [fname for fname, _, _ in files]
+            st.session_state.filename_index = FilenameIndex(st.session_state.filenames)
+            
+            # Parse committee, dates, item number and document type of every file for the facet filters
+            st.session_state.catalog = build_catalog(files, catalog_base_parts())
+            try:
+                record_catalog(url, st.session_state.catalog)
+            except Exception as e:
+                print(f"[CATALOG] Could not record documents: {e}")
+            
+            # Sizes of mirrored documents are known from the mirror's manifest
+            if mirror is not None:
+                st.session_state.file_metadata = mirror.metadata()
             
             st.session_state.progress_placeholder.empty()
             
@@ -196,6 +320,19 @@ def main():
             else:
                 st.success(f"Found {len(files)} PDF files! (completed in {total_time:.2f}s)")
             
+            if isinstance(result, dict) and result.get('mirror_complete') is False:
+                st.warning("The search goes deeper than the mirror was synced, so the deepest folders are missing. Sync with a larger --depth to include them.")
+            
+            target_folders = result.get('target_folders') if isinstance(result, dict) else None
+            if isinstance(result, dict) and result.get('path_index_error'):
+                st.warning(result['path_index_error'])
+            elif target_folders is not None:
+                if target_folders:
+                    st.info(f"Searched {len(target_folders)} folders from the path index: " + ", ".join(path or "main folder" for path in target_folders[:10])
+                            + (" ..." if len(target_folders) > 10 else ""))
+                else:
+                    st.warning("No folder matches that path or date interval below this URL.")
+            
             # Show error folders if any exist
             if error_folders:
                 with st.expander(f"⚠️ Folders with scanning errors ({len(error_folders)}) - Try increasing loading time"):
@@ -209,6 +346,8 @@ def main():
             st.error(f"Error searching for files: {e}")
             if st.session_state.progress_placeholder:
                 st.session_state.progress_placeholder.empty()    # Step 2: Display results with hierarchical structure
+    merge_finished_expansions()
+    
     if 'files' in st.session_state:
         st.markdown("---")
         st.markdown("### 📋 Available PDFs")
@@ -218,45 +357,114 @@ def main():
             # Filter controls
             st.markdown("**Filter controls:**")
 
-            with st.form("select_filter_form"):
-                col_text1, col_btn1 = st.columns([0.7, 0.3])
-                with col_text1:
-                    select_filter_text = st.text_input(
-                        "Add all filenames containing:", 
+            if 'catalog' not in st.session_state:
+                st.session_state.catalog = build_catalog(st.session_state.files, catalog_base_parts())
+            catalog = st.session_state.catalog
+            committee_counts = facet_counts(catalog, 'committee')
+            type_counts = facet_counts(catalog, 'doc_type')
+            catalog_dates = date_bounds(catalog)
+            
+            with st.form("facet_filter_form"):
+                col_facet1, col_facet2 = st.columns(2)
+                with col_facet1:
+                    facet_committees = st.multiselect(
+                        "Committee:",
+                        options=list(committee_counts),
+                        format_func=lambda committee: f"{committee or '(no committee)'} ({committee_counts[committee]})"
+                    )
+                    facet_types = st.multiselect(
+                        "Document type:",
+                        options=list(type_counts),
+                        format_func=lambda doc_type: f"{doc_type} ({type_counts[doc_type]})"
+                    )
+                with col_facet2:
+                    facet_dates = None
+                    if catalog_dates:
+                        facet_dates = st.date_input(
+                            "Document date between:",
+                            value=catalog_dates,
+                            help="Dates come from the filename or the innermost dated folder. Undated files are left out when the interval is narrowed."
+                        )
+                    facet_text = st.text_input(
+                        "Filename contains:", 
                         placeholder="Filter text", 
-                        key="select_filter_input"
+                        key="facet_text_input"
                     )
+                col_btn1, col_btn2, col_btn3 = st.columns(3)
                 with col_btn1:
-                    st.markdown("<br>", unsafe_allow_html=True)
                     select_filter_btn = st.form_submit_button("Add matching")
-
-            with st.form("deselect_filter_form"):
-                col_text2, col_btn2 = st.columns([0.7, 0.3])
-                with col_text2:
-                    deselect_filter_text = st.text_input(
-                        "Remove all filenames containing:", 
-                        placeholder="Filter text", 
-                        key="deselect_filter_input"
-                    )
                 with col_btn2:
-                    st.markdown("<br>", unsafe_allow_html=True)
                     deselect_filter_btn = st.form_submit_button("Remove matching")
+                with col_btn3:
+                    only_filter_btn = st.form_submit_button("Select only matching")
+            
+            # Content search over documents downloaded earlier (see "Download as a verified ZIP file")
+            if 'content_index' not in st.session_state:
+                st.session_state.content_index = load_content_index()
+            content_index = st.session_state.content_index
+            
+            with st.form("content_filter_form"):
+                col_text3, col_btn3 = st.columns([0.7, 0.3])
+                with col_text3:
+                    content_filter_text = st.text_input(
+                        "Add all files mentioning (searches inside downloaded PDFs):", 
+                        placeholder="e.g. regionstyrelsen beslut", 
+                        key="content_filter_input",
+                        help=f"{len(content_index.documents)} downloaded documents are indexed"
+                    )
+                with col_btn3:
+                    st.markdown("<br>", unsafe_allow_html=True)
+                    content_filter_btn = st.form_submit_button("Add mentioning")
+            
+            if st.button("📚 Index downloaded documents", key="update_content_index", help="Extract the text of the PDFs downloaded to the server so they can be searched"):
+                index_progress = st.progress(0.0, text="Indexing documents...")
+                document_stores = mirror.document_stores() if mirror is not None else [(DOCUMENT_STORE_DIR, load_manifest(DOCUMENT_STORE_DIR))]
+                for documents_dir, manifest in document_stores:
+                    update_content_index(
+                        content_index,
+                        documents_dir,
+                        manifest,
+                        progress_callback=lambda current, total, message: index_progress.progress(current / total, text=message)
+                    )
+                content_index = st.session_state.content_index = save_content_index(content_index)
+                index_progress.empty()
         
             # Group files by folder
             files_by_folder = group_files_by_folder()
+            file_locations = st.session_state.get('file_locations', {})
+            if 'filename_index' not in st.session_state:
+                st.session_state.filename_index = FilenameIndex(st.session_state.filenames)
             
             # Apply filter actions and show selection controls only if there are files
-            if select_filter_btn and select_filter_text:
-                for folder in files_by_folder:
-                    for fname in files_by_folder[folder]:
-                        if select_filter_text.lower() in fname.lower():
-                            st.session_state[f"select_{folder}_{fname}"] = True
+            if select_filter_btn or deselect_filter_btn or only_filter_btn:
+                # The date facet only filters once it is narrowed (the picker returns one date while a range is being picked)
+                date_range = None
+                if facet_dates and len(facet_dates) == 2 and tuple(facet_dates) != catalog_dates:
+                    date_range = tuple(facet_dates)
+                matches = filter_catalog(
+                    catalog,
+                    committees=facet_committees,
+                    doc_types=facet_types,
+                    date_range=date_range,
+                    filenames=set(st.session_state.filename_index.search(facet_text)) if facet_text else None
+                )
+                if only_filter_btn:
+                    for fname, matched in zip(catalog['filename'], matches):
+                        st.session_state[f"select_{file_locations.get(fname, 'current')}_{fname}"] = bool(matched)
+                else:
+                    for fname in catalog.loc[matches, 'filename']:
+                        st.session_state[f"select_{file_locations.get(fname, 'current')}_{fname}"] = bool(select_filter_btn)
+                action = "Added" if select_filter_btn else "Removed" if deselect_filter_btn else "Selected only"
+                st.info(f"{action} {int(matches.sum())} matching files")
             
-            if deselect_filter_btn and deselect_filter_text:
-                for folder in files_by_folder:
-                    for fname in files_by_folder[folder]:
-                        if deselect_filter_text.lower() in fname.lower():
-                            st.session_state[f"select_{folder}_{fname}"] = False
+            if content_filter_btn and content_filter_text:
+                matching_hashes = content_index.search(content_filter_text)
+                matched_count = 0
+                for fname, file_url, folder_location in st.session_state.files:
+                    if get_document_hash(file_url) in matching_hashes:
+                        st.session_state[f"select_{folder_location}_{fname}"] = True
+                        matched_count += 1
+                st.info(f"Added {matched_count} files mentioning \"{content_filter_text}\"")
             
             # Selection controls
             st.markdown("**Selection controls:**")
@@ -287,6 +495,32 @@ def main():
                 total_count = sum(len(files) for files in files_by_folder.values())
                 st.metric("Total", total_count)
 
+            # Optional size check before downloading
+            if 'file_metadata' not in st.session_state:
+                st.session_state.file_metadata = load_metadata_cache()
+            
+            if mirror is None and st.button("📏 Check file sizes", key="check_sizes", help="Ask the server for the size of each file without downloading it"):
+                size_progress = st.progress(0.0, text="Checking file sizes...")
+                st.session_state.file_metadata = prefetch_file_metadata(
+                    st.session_state.files,
+                    cache=st.session_state.file_metadata,
+                    progress_callback=lambda current, total, message: size_progress.progress(current / total, text=message)
+                )
+                st.session_state.file_metadata = save_metadata_cache(st.session_state.file_metadata)
+                size_progress.empty()
+            
+            folder_sizes = summarize_by_folder(st.session_state.files, st.session_state.file_metadata)
+            if any(totals['known'] for totals in folder_sizes.values()):
+                known_files = sum(totals['known'] for totals in folder_sizes.values())
+                total_bytes = sum(totals['bytes'] for totals in folder_sizes.values())
+                st.caption(f"Total size: {format_size(total_bytes)} ({known_files}/{len(st.session_state.files)} files checked)")
+            
+            def folder_size_label(folder_location):
+                totals = folder_sizes.get(folder_location)
+                if not totals or not totals['known']:
+                    return ""
+                return f", {format_size(totals['bytes'])}"
+
             # Show breadcrumb
             if 'breadcrumb_links' in st.session_state:
                 breadcrumb_html = create_clickable_breadcrumb(
@@ -318,7 +552,7 @@ def main():
                 
                 # Make current folder name clickable
                 current_url = st.session_state.get('url', '#')
-                st.markdown(f"[📁 **Current folder**]({current_url}) ({selected_in_current}/{len(current_files)} selected)")
+                st.markdown(f"[📁 **Current folder**]({current_url}) ({selected_in_current}/{len(current_files)} selected{folder_size_label('current')})")
                 
                 for fname in current_files:
                     cols = st.columns([0.05, 0.75, 0.2])
@@ -352,14 +586,14 @@ def main():
                     cols = st.columns([indent_width, 1.0 - indent_width])
                     with cols[1]:
                         if folder_location in folder_urls:
-                            st.markdown(f"[📁 **{folder_location}**]({folder_urls[folder_location]}) ({selected_in_folder}/{len(folder_files)} selected)")
+                            st.markdown(f"[📁 **{folder_location}**]({folder_urls[folder_location]}) ({selected_in_folder}/{len(folder_files)} selected{folder_size_label(folder_location)})")
                         else:
-                            st.markdown(f"📁 **{folder_location}** ({selected_in_folder}/{len(folder_files)} selected)")
+                            st.markdown(f"📁 **{folder_location}** ({selected_in_folder}/{len(folder_files)} selected{folder_size_label(folder_location)})")
                 else:
                     if folder_location in folder_urls:
-                        st.markdown(f"[📁 **{folder_location}**]({folder_urls[folder_location]}) ({selected_in_folder}/{len(folder_files)} selected)")
+                        st.markdown(f"[📁 **{folder_location}**]({folder_urls[folder_location]}) ({selected_in_folder}/{len(folder_files)} selected{folder_size_label(folder_location)})")
                     else:
-                        st.markdown(f"📁 **{folder_location}** ({selected_in_folder}/{len(folder_files)} selected)")
+                        st.markdown(f"📁 **{folder_location}** ({selected_in_folder}/{len(folder_files)} selected{folder_size_label(folder_location)})")
                 
                 # Display files with indentation
                 for fname in folder_files:
@@ -416,8 +650,8 @@ def main():
                 # Check if this folder was within the search scope
                 folder_depth = get_folder_depth(subfolder_path)
                 
-                if folder_depth > search_depth:
-                    # Folder was beyond the search depth
+                if folder_depth > search_depth and subfolder_path not in st.session_state.get('expanded_folders', set()):
+                    # Folder was beyond the search depth and has not been expanded
                     folders_not_searched.append(subfolder_path)
                 elif subfolder_path not in files_by_folder or len(files_by_folder[subfolder_path]) == 0:
                     # Folder was searched but contains no PDFs
@@ -465,18 +699,33 @@ def main():
             # Show folders not searched expander
             if folders_not_searched:
                 search_reason = "current folder only selected" if not include_subfolders else "beyond selected depth"
-                with st.expander(f"🔍 Folders not searched ({len(folders_not_searched)}) - {search_reason.title()}"):
-                    if not include_subfolders:
-                        st.info("These folders were found but not searched because 'Current folder only' was selected. Choose 'Include subfolders' to search them.")
+                lazy_tree = st.session_state.get('lazy_tree', False)
+                if lazy_tree:
+                    search_reason = "expand on demand"
+                with st.expander(f"🔍 Folders not searched ({len(folders_not_searched)}) - {search_reason.title()}", expanded=lazy_tree):
+                    if lazy_tree:
+                        st.info("Click ➕ to scan a folder. Its files and subfolders are added to the list above when the scan is done.")
+                    elif not include_subfolders:
+                        st.info("These folders were found but not searched because 'Current folder only' was selected. Choose 'Include subfolders' to search them, or click ➕ to scan a single folder.")
                     else:
-                        st.info("These folders were found but not searched because they exceed the selected search depth. Increase the 'Subfolder depth' setting to include them.")
+                        st.info("These folders were found but not searched because they exceed the selected search depth. Increase the 'Subfolder depth' setting to include them, or click ➕ to scan a single folder.")
+                    pending_expansions = st.session_state.get('pending_expansions', {})
                     for unsearched_folder in sorted(folders_not_searched):
                         folder_depth = get_folder_depth(unsearched_folder)
                         indent = "  " * folder_depth
-                        if unsearched_folder in folder_urls:
-                            st.markdown(f'{indent}[📁 {unsearched_folder}]({folder_urls[unsearched_folder]})')
-                        else:
-                            st.write(f"{indent}📁 {unsearched_folder}")
+                        cols = st.columns([0.85, 0.15])
+                        with cols[0]:
+                            if unsearched_folder in folder_urls:
+                                st.markdown(f'{indent}[📁 {unsearched_folder}]({folder_urls[unsearched_folder]})')
+                            else:
+                                st.write(f"{indent}📁 {unsearched_folder}")
+                        with cols[1]:
+                            if unsearched_folder in pending_expansions:
+                                st.write("⏳")
+                            elif unsearched_folder in folder_urls:
+                                if st.button("➕", key=f"expand_{unsearched_folder}", help="Scan this folder"):
+                                    start_folder_expansion(unsearched_folder, folder_urls[unsearched_folder])
+                                    st.rerun()
             
             # Show excluded folders if any exist
             if excluded_folders:
@@ -501,6 +750,29 @@ def main():
                             else:
                                 st.write(f"📁 {excluded_folder}")
 
+        # Export of the search results for other tools
+        if st.session_state.files:
+            with st.expander("💾 Export search results"):
+                st.markdown("One record per document with name, folder path, depth, URL, document hash and the dates parsed from the folder names.")
+                export_formats = {"JSON Lines": ("jsonl", "application/x-ndjson"), "CSV": ("csv", "text/csv"), "Parquet": ("parquet", "application/octet-stream")}
+                export_col1, export_col2 = st.columns([0.6, 0.4])
+                with export_col1:
+                    export_format = st.selectbox("Format:", list(export_formats), key="export_format")
+                with export_col2:
+                    st.markdown("<br>", unsafe_allow_html=True)
+                    if st.button("Prepare export", key="prepare_export"):
+                        extension, _ = export_formats[export_format]
+                        st.session_state.export_data = (export_format, export_to_bytes(st.session_state.files, extension))
+                
+                if st.session_state.get('export_data') and st.session_state.export_data[0] == export_format:
+                    extension, mime = export_formats[export_format]
+                    st.download_button(
+                        f"⬇️ Download {export_format}",
+                        data=st.session_state.export_data[1],
+                        file_name=f"{st.session_state.get('folder_display_name', 'documents').replace(' > ', '_')}.{extension}",
+                        mime=mime
+                    )
+
         # Download section - only show if there are actually files to download
         if st.session_state.files:
             st.markdown("---")
@@ -528,49 +800,216 @@ def main():
                 
                 
 
-                # Generate JavaScript code with delays to prevent 503 errors
-                if len(selected_links) == 1:
-                    # Single file - no delay needed
-                    js_code = f"javascript:window.open('{selected_links[0]}');"
-                else:
-                    # Multiple files - add 500ms delay between opens
-                    js_parts = []
-                    for i, link in enumerate(selected_links):
-                        delay = i * 500  # 500ms delay for each subsequent file
-                        js_parts.append(f"setTimeout(() => window.open('{link}'), {delay});")
-                    js_code = "javascript:" + "".join(js_parts)
+                if mirror is not None:
+                    st.markdown("**Download from the mirror:** the selected files are packed into a ZIP file from the local mirror.")
+                    if st.button("📦 Prepare ZIP file", key="prepare_mirror_zip"):
+                        selected_set = set(selected_files)
+                        zip_buffer = io.BytesIO()
+                        missing_files = []
+                        with zipfile.ZipFile(zip_buffer, "w") as zip_file:
+                            for fname, file_url, _ in st.session_state.files:
+                                if fname not in selected_set:
+                                    continue
+                                local_path = mirror.local_path(file_url)
+                                if local_path:
+                                    zip_file.write(local_path, archive_name(fname))
+                                else:
+                                    missing_files.append((fname, file_url))
+                        st.session_state.mirror_zip = (zip_buffer.getvalue(), missing_files)
+                    
+                    if 'mirror_zip' in st.session_state:
+                        zip_bytes, missing_files = st.session_state.mirror_zip
+                        for fname, file_url in missing_files:
+                            st.warning(f"[📄 **{fname}**]({file_url}) has not been downloaded to the mirror yet")
+                        st.download_button(
+                            "⬇️ Download ZIP",
+                            data=zip_bytes,
+                            file_name=f"{st.session_state.get('folder_display_name', 'documents').replace(' > ', '_')}.zip",
+                            mime="application/zip"
+                        )
+                    st.markdown("**Or download in the browser:**")
+
+                # Generate a compact script that downloads with a bounded concurrency pool
+                concurrency = st.select_slider(
+                    "Parallel downloads:",
+                    options=[1, 2, 3, 4, 6, 8],
+                    value=4,
+                    help="How many files the browser downloads at the same time. Lower this if many files fail with 503 errors."
+                )
+                selected_names = [fname for fname in selected_files if fname in filelinks]
+                # The browser has its own connection to NetPublicator, so it starts unthrottled and backs off on 503s itself
+                js_code = generate_download_script(selected_links, selected_names, concurrency=concurrency)
                 
                 st.code(js_code, language="javascript")
                 
-                delay_info = f" (with 0.5s delays)" if len(selected_links) > 1 else ""
-                
-                
                 st.markdown(f"""
-                **To download{delay_info}:**
+                **To download ({concurrency} at a time):**
                 1. Copy the JavaScript code above (click the copy button in the top-right of the code box)
-                2. Open your browser's developer console (F12 or Ctrl+Shift+J)
+                2. Open any NetPublicator page (e.g. the folder you searched) and open the browser's developer console there (F12 or Ctrl+Shift+J)
                 3. Paste the code and press Enter
-                4. Your browser will open each PDF in a new tab with delays to prevent server overload
+                4. Your browser will save the PDFs directly and report progress in the console, retrying files that get a 503 error
                 """)
 
                 with st.expander("First time only: Allow pasting in console and allow popups"):
                     st.markdown("""
                     5. The first time you will need to pass a security test by writing "allow pasting" in the console after your first pasting attempt.
-                    6. Then you will get a popup blocker after the first file has downloaded. Change to "Tillåt alltid nedladdningar från..." and try step 3 again to get all files at once.
+                    6. Chrome may ask whether the site may download multiple files. Change to "Tillåt alltid nedladdningar från..." and try step 3 again to get all files at once.
                     """)
 
                 with st.expander("Troubleshooting"):
                     st.markdown(f"""
-                    * **Automatic delay protection**: The generated JavaScript includes 0.5-second delays between file downloads to prevent server overload (503 errors).
+                    * **Automatic retry protection**: The generated JavaScript only downloads a few files at a time and retries files that get a 503 error, waiting a little longer after each attempt.
                     
                     * If you are asked to select and confirm the download destination for each file, you can disable that by visiting **chrome://settings/downloads** in a new browser tab.
                     
-                    * **For large batches**: Files will open with staggered timing to reduce server strain. Wait for all tabs to open before closing any.
+                    * **For large batches**: Keep the console tab open until it prints "Done". Lower the number of parallel downloads if many files need retries.
                     
-                    * If some tabs still get stuck on a 503 error message, you can click the "Hämta igen" buttons at the bottom of those tabs, or press Enter in the address field to retry the download.
+                    * Files that still fail after all retries are opened in new tabs at the end. If some of those tabs get stuck on a 503 error message, you can click the "Hämta igen" buttons at the bottom of those tabs, or press Enter in the address field to retry the download.
                     """)
+
+                if mirror is None:
+                    with st.expander("📦 Alternative: Download as a verified ZIP file"):
+                        st.markdown("The server downloads the selected files, checks that each one is a complete PDF, retries broken ones automatically and packs them into one ZIP file.")
+                        if st.button("Prepare ZIP file", key="prepare_zip"):
+                            selected_set = set(selected_files)
+                            selected_entries = [f for f in st.session_state.files if f[0] in selected_set]
+                            zip_progress = st.progress(0.0, text="Checking for changed files...")
+                            # Stored copies are only reused if the server still reports the same ETag/Last-Modified right now
+                            st.session_state.file_metadata = prefetch_file_metadata(
+                                selected_entries,
+                                cache=st.session_state.get('file_metadata'),
+                                refresh=True,
+                                progress_callback=lambda current, total, message: zip_progress.progress(current / total, text=message)
+                            )
+                            st.session_state.file_metadata = save_metadata_cache(st.session_state.file_metadata)
+                            # Files are kept in the document store so they can be searched and reused next time
+                            download_result = download_files(
+                                selected_entries,
+                                DOCUMENT_STORE_DIR,
+                                metadata=st.session_state.file_metadata,
+                                progress_callback=lambda current, total, message: zip_progress.progress(current / total if total else 1.0, text=message)
+                            )
+                            manifest = load_manifest(DOCUMENT_STORE_DIR)
+                            zip_buffer = io.BytesIO()
+                            with zipfile.ZipFile(zip_buffer, "w") as zip_file:
+                                for fname, file_url, _ in selected_entries:
+                                    entry = manifest.get(get_document_hash(file_url))
+                                    if entry and os.path.exists(os.path.join(DOCUMENT_STORE_DIR, entry['path'])):
+                                        # Stored files are named by hash; the ZIP keeps the folder structure of the search
+                                        zip_file.write(os.path.join(DOCUMENT_STORE_DIR, entry['path']), archive_name(fname))
+                            zip_progress.empty()
+                            # The store is shared by all sessions; keep it bounded, least recently used documents go first
+                            evict_documents(DOCUMENT_STORE_DIR, keep={get_document_hash(file_url) for _, file_url, _ in selected_entries})
+                            st.session_state.zip_bytes = zip_buffer.getvalue()
+                            st.session_state.zip_result = download_result
+                    
+                        if 'zip_bytes' in st.session_state:
+                            zip_result = st.session_state.zip_result
+                            st.success(f"{len(zip_result['downloaded'])} files downloaded and verified, {len(zip_result['skipped'])} unchanged files reused ({zip_result['retries']} retries)")
+                            for failure in zip_result['failed']:
+                                st.warning(f"[📄 **{failure['file']}**]({failure['url']}): {failure['reason']} after {failure['attempts']} attempts")
+                            st.download_button(
+                                "⬇️ Download ZIP",
+                                data=st.session_state.zip_bytes,
+                                file_name=f"{st.session_state.get('folder_display_name', 'documents').replace(' > ', '_')}.zip",
+                                mime="application/zip"
+                            )
             else:
                 st.info("👆 Select files above to generate download code")
+    
+    startup_timings = get_startup_timings()
+    if startup_timings:
+        with st.sidebar.expander("⏱️ Startup timings"):
+            for phase, seconds in startup_timings.items():
+                st.write(f"{phase.replace('_', ' ').capitalize()}: {seconds:.2f}s")
+    
+    # Keep polling while folders are being expanded in the background
+    if st.session_state.get('pending_expansions'):
+        time.sleep(1.0)
+        st.rerun()
+
+@st.cache_resource
+def get_app_mirror():
+    """Mirror configured with NETPUBLICATOR_MIRROR, shared by all sessions (None if not configured)"""
+    return get_mirror()
+
+@st.cache_resource
+def get_expansion_executor():
+    """Thread pool shared by all sessions for background folder expansion"""
+    return ThreadPoolExecutor(max_workers=2)
+
+def start_folder_expansion(folder_path, folder_url):
+    """Scan one folder in the background, reusing an earlier scan of the same folder"""
+    settings = st.session_state.get('search_settings', {})
+    cache = st.session_state.setdefault('expansion_cache', {})
+    cache_key = (folder_url, folder_path, tuple(settings.get('exclude_folders', [])),
+                 tuple(settings.get('date_filter', ())))
+    
+    if cache_key in cache:
+        merge_folder_result(folder_path, cache[cache_key])
+        return
+    
+    # The mirror answers right away, without a browser
+    mirror = get_app_mirror()
+    if mirror is not None:
+        result = mirror.expand(st.session_state.url, folder_path, settings.get('exclude_folders'), settings.get('date_filter'))
+        if result is not None:
+            merge_folder_result(folder_path, result)
+        return
+    
+    future = get_expansion_executor().submit(
+        expand_netpublicator_folder,
+        folder_url,
+        folder_path,
+        exclude_folders=settings.get('exclude_folders'),
+        date_filter=settings.get('date_filter'),
+        search_delay=settings.get('search_delay', 0.7)
+    )
+    st.session_state.pending_expansions[folder_path] = (future, cache_key)
+
+def merge_finished_expansions():
+    """Merge the results of finished background expansions into the search results"""
+    pending_expansions = st.session_state.get('pending_expansions', {})
+    for folder_path, (future, cache_key) in list(pending_expansions.items()):
+        if not future.done():
+            continue
+        del pending_expansions[folder_path]
+        try:
+            result = future.result()
+        except Exception as e:
+            st.error(f"Error scanning {folder_path}: {e}")
+            continue
+        st.session_state.setdefault('expansion_cache', {})[cache_key] = result
+        merge_folder_result(folder_path, result)
+
+def merge_folder_result(folder_path, result):
+    """Add the files and subfolders of an expanded folder to the session state"""
+    known_files = set(st.session_state.filelinks)
+    for fname, furl, floc in result['files']:
+        if fname in known_files:
+            continue
+        st.session_state.files.append((fname, furl, floc))
+        st.session_state.filenames.append(fname)
+        st.session_state.filelinks[fname] = furl
+        st.session_state.file_locations[fname] = floc
+        if 'filename_index' in st.session_state:
+            st.session_state.filename_index.add(fname)
+    if 'catalog' in st.session_state:
+        st.session_state.catalog = extend_catalog(st.session_state.catalog, st.session_state.files[len(st.session_state.catalog):],
+                                                  catalog_base_parts())
+    
+    known_folders = {path for _, _, path in st.session_state.subfolders}
+    st.session_state.subfolders.extend(
+        subfolder for subfolder in result['subfolders'] if subfolder[2] not in known_folders
+    )
+    st.session_state.excluded_folders.extend(result['excluded_folders'])
+    st.session_state.excluded_folder_urls.update(result['excluded_folder_urls'])
+    st.session_state.error_folders.extend(result['error_folders'])
+    st.session_state.expanded_folders.add(folder_path)
+
+def catalog_base_parts():
+    """Return the folder names from the top of the reader down to the searched folder, for the catalog"""
+    return [text for text, _ in st.session_state.get('breadcrumb_links') or []]
 
 def group_files_by_folder():
     """Group files by their folder location"""
@@ -588,5 +1027,28 @@ def group_files_by_folder():
     
     return files_by_folder
 
+def run():
+    """Render the app, profiling the whole render pass when the hidden debug toggle is on (?debug=1)"""
+    debug_mode = st.experimental_get_query_params().get("debug", ["0"])[0] == "1"
+    profile_enabled = debug_mode and st.sidebar.checkbox(
+        "🐢 Profile this run",
+        key="profile_enabled",
+        help="Sample the call stack while the page renders, including any search started in this run"
+    )
+    
+    profiler = None
+    try:
+        with profile(enabled=profile_enabled) as profiler:
+            main()
+    finally:
+        if profiler is not None:
+            st.session_state.last_profile = (profiler.format_report(), profiler.collapsed())
+    
+    if debug_mode and 'last_profile' in st.session_state:
+        report, collapsed = st.session_state.last_profile
+        with st.sidebar.expander("Last profile"):
+            st.code(report)
+            st.download_button("Download stacks for flamegraph", data=collapsed, file_name="render_profile.collapsed")
+
 if __name__ == "__main__":
-    main()
+    run()
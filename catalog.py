@@ -0,0 +1,299 @@
+"""
+Structured catalog of crawled documents with faceted filtering.
+
+Folder and file names encode the committee, the meeting date, the agenda item
+and the kind of document ("Regionstyrelsen/År 2024/2024-06-12/Bilaga 2 -
+ärende 5.pdf"). The catalog parses every crawled file once into typed columns
+and keeps them in a pandas DataFrame, so facet filters are evaluated as
+vectorized column operations instead of string tests per file. Parsed records
+are also stored in an indexed SQLite table, where they can be queried across
+crawls:
+
+Usage:
+    python catalog.py https://www.netpublicator.com/reader/r90521909 --committee Regionstyrelsen --type Protokoll --from 2024-01-01
+"""
+import os
+import re
+import sys
+import time
+import argparse
+from datetime import date
+from downloader import get_document_hash, _parse_folder_date_range
+from exporter import folder_date_range
+from path_index import reader_key
+from sqlite_store import connect
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "catalog.sqlite")
+
+CATALOG_FIELDS = ["filename", "folder_location", "url", "document_hash", "committee",
+                  "meeting_date", "date_start", "date_end", "item_number", "doc_type"]
+
+OTHER_TYPE = "Övrigt"
+
+# Document type -> words that identify it in a filename. The word that appears first in the name
+# decides, so "Bilaga 1 - Protokollsutdrag" is an attachment.
+DOCUMENT_TYPES = {
+    "Protokollsutdrag": ("protokollsutdrag", "utdrag ur protokoll"),
+    "Protokoll": ("protokoll",),
+    "Kallelse": ("kallelse",),
+    "Föredragningslista": ("föredragningslista", "dagordning"),
+    "Bilaga": ("bilaga",),
+    "Tjänsteskrivelse": ("tjänsteskrivelse", "tjänsteutlåtande"),
+    "Beslutsunderlag": ("beslutsunderlag",),
+    "Beslut": ("beslut",),
+    "Motion": ("motion",),
+    "Interpellation": ("interpellation",),
+    "Remiss": ("remiss",),
+    "Yttrande": ("yttrande",),
+    "Rapport": ("rapport",),
+    "Presentation": ("presentation",),
+}
+
+_TYPE_BY_WORD = {word: doc_type for doc_type, words in DOCUMENT_TYPES.items() for word in words}
+# Longer words first, so "protokollsutdrag" wins over "protokoll" at the same position
+_TYPE_PATTERN = re.compile("|".join(re.escape(word) for word in sorted(_TYPE_BY_WORD, key=len, reverse=True)))
+_ITEM_PATTERN = re.compile(r"(?:§|ärende|punkt)\s*(\d{1,4})\b", re.IGNORECASE)
+_LEADING_NUMBER_PATTERN = re.compile(r"^(\d{1,3})(?:[\s._)-]|$)")
+_DATE_PATTERN = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    reader TEXT,
+    url TEXT,
+    filename TEXT,
+    folder_location TEXT,
+    document_hash TEXT,
+    committee TEXT,
+    meeting_date TEXT,
+    date_start TEXT,
+    date_end TEXT,
+    item_number INTEGER,
+    doc_type TEXT,
+    updated REAL,
+    PRIMARY KEY (reader, url)
+);
+CREATE INDEX IF NOT EXISTS documents_committee ON documents (reader, committee);
+CREATE INDEX IF NOT EXISTS documents_type ON documents (reader, doc_type);
+CREATE INDEX IF NOT EXISTS documents_dates ON documents (reader, date_start, date_end);
+"""
+
+def parse_document_type(filename):
+    """Return the document type of a filename (OTHER_TYPE if no known word appears in it)"""
+    match = _TYPE_PATTERN.search(filename.lower())
+    return _TYPE_BY_WORD[match.group(0)] if match else OTHER_TYPE
+
+def parse_item_number(filename):
+    """Return the agenda item number of a filename ("§ 12", "ärende 3", "4. Motion ..."), or None"""
+    match = _ITEM_PATTERN.search(filename) or _LEADING_NUMBER_PATTERN.search(filename)
+    return int(match.group(1)) if match else None
+
+def parse_folder(folder_parts, base_depth=0):
+    """
+    Parse the catalog fields a folder gives to the documents in it
+
+    Args:
+        folder_parts: Folder names from the top of the reader down to the folder
+        base_depth: Number of leading names that are the reader's top folder and not a committee
+
+    Returns:
+        Tuple (committee, meeting date, date start, date end); dates are ISO strings or None
+    """
+    committee = ""
+    for i, folder_name in enumerate(folder_parts):
+        if _parse_folder_date_range(folder_name) is not None:
+            # The committee is the folder above the first year, period or meeting folder
+            break
+        if i >= base_depth:
+            committee = folder_name
+
+    start_date, end_date = folder_date_range("/".join(folder_parts))
+    meeting_date = start_date if start_date is not None and start_date == end_date else None
+    return (committee,
+            meeting_date.isoformat() if meeting_date else None,
+            start_date.isoformat() if start_date else None,
+            end_date.isoformat() if end_date else None)
+
+def iter_catalog_records(files, base_parts=()):
+    """
+    Parse crawled files into catalog records
+
+    Args:
+        files: Iterable of (filename, url, folder_location) tuples, e.g. result['files']
+        base_parts: Breadcrumb names of the folder the crawl started at, so documents found
+            below a committee's folder still get its name
+
+    Yields:
+        Tuple per document with the fields in CATALOG_FIELDS
+    """
+    base_parts = list(base_parts)
+    # The reader's top folder ("Region Dalarna") is not a committee
+    base_depth = 1 if base_parts else 0
+    folders = {}
+    for fname, file_url, folder_location in files:
+        folder = folders.get(folder_location)
+        if folder is None:
+            relative_parts = [] if folder_location == "current" else [part for part in folder_location.split('/') if part]
+            folder = folders[folder_location] = parse_folder(base_parts + relative_parts, base_depth)
+        committee, meeting_date, date_start, date_end = folder
+
+        name = fname.split('/')[-1]
+        date_match = _DATE_PATTERN.search(name)
+        if date_match and _parse_folder_date_range(date_match.group(1)) is not None:
+            # A date in the filename is more precise than the folder's year
+            meeting_date = date_start = date_end = date_match.group(1)
+
+        yield (fname, folder_location, file_url, get_document_hash(file_url), committee,
+               meeting_date, date_start, date_end, parse_item_number(name), parse_document_type(name))
+
+def build_catalog(files, base_parts=()):
+    """
+    Build the catalog DataFrame of crawled files
+
+    Committee and document type are categoricals and dates are datetime64 columns, so the
+    facet filters in filter_catalog run over whole columns at once.
+    """
+    import pandas as pd
+
+    return _typed(pd.DataFrame.from_records(list(iter_catalog_records(files, base_parts)), columns=CATALOG_FIELDS))
+
+def extend_catalog(catalog, files, base_parts=()):
+    """Return the catalog with the records of more crawled files (e.g. from a folder expansion) appended"""
+    import pandas as pd
+
+    added = build_catalog(files, base_parts)
+    if catalog is None or catalog.empty:
+        return added
+    if added.empty:
+        return catalog
+    return _typed(pd.concat([catalog.astype({'committee': str, 'doc_type': str}),
+                             added.astype({'committee': str, 'doc_type': str})], ignore_index=True))
+
+def filter_catalog(catalog, committees=None, doc_types=None, date_range=None, filenames=None):
+    """
+    Evaluate facet filters over the whole catalog
+
+    Args:
+        catalog: DataFrame from build_catalog
+        committees: Committees to keep (None or empty for all)
+        doc_types: Document types to keep (None or empty for all)
+        date_range: (earliest, latest) dates; documents whose date range overlaps it are kept,
+            undated documents are dropped (None for no date filter)
+        filenames: Collection of filenames to keep, e.g. the matches of a FilenameIndex search
+
+    Returns:
+        Boolean Series, True for the documents matching every facet
+    """
+    import pandas as pd
+
+    mask = pd.Series(True, index=catalog.index)
+    if committees:
+        mask &= catalog['committee'].isin(committees)
+    if doc_types:
+        mask &= catalog['doc_type'].isin(doc_types)
+    if date_range:
+        earliest, latest = (pd.Timestamp(value) for value in date_range)
+        # NaT compares False, so undated documents drop out
+        mask &= (catalog['date_end'] >= earliest) & (catalog['date_start'] <= latest)
+    if filenames is not None:
+        mask &= catalog['filename'].isin(filenames)
+    return mask
+
+def facet_counts(catalog, column):
+    """Return {value: number of documents} for a facet column, most common first"""
+    return {value: int(count) for value, count in catalog[column].value_counts(sort=True).items() if count}
+
+def date_bounds(catalog):
+    """Return the (earliest, latest) document dates in the catalog, or None if no document is dated"""
+    if catalog['date_start'].isna().all():
+        return None
+    return catalog['date_start'].min().date(), catalog['date_end'].max().date()
+
+def record_catalog(url, catalog, db_path=CATALOG_PATH):
+    """
+    Store catalog records in the catalog database, replacing earlier records of the same documents
+
+    Returns:
+        Number of documents recorded
+    """
+    if catalog.empty:
+        return 0
+    reader = reader_key(url)
+    now = time.time()
+    columns = {column: catalog[column].astype(object).where(catalog[column].notna(), None).tolist()
+               for column in ("item_number", "committee", "doc_type")}
+    for column in ("meeting_date", "date_start", "date_end"):
+        dates = catalog[column].dt.strftime("%Y-%m-%d")
+        columns[column] = dates.where(dates.notna(), None).tolist()
+    rows = [(reader,) + row + (now,) for row in zip(
+        catalog['url'], catalog['filename'], catalog['folder_location'], catalog['document_hash'], columns['committee'],
+        columns['meeting_date'], columns['date_start'], columns['date_end'], columns['item_number'], columns['doc_type'])]
+    with _connect(db_path) as conn:
+        conn.executemany(
+            """INSERT OR REPLACE INTO documents (reader, url, filename, folder_location, document_hash, committee,
+                   meeting_date, date_start, date_end, item_number, doc_type, updated)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            rows
+        )
+    return len(rows)
+
+def load_catalog(url, committees=None, doc_types=None, date_range=None, db_path=CATALOG_PATH):
+    """
+    Load the stored records of a reader as a catalog DataFrame, filtered in the database
+
+    The facet arguments work like in filter_catalog and use the table's indexes.
+    """
+    import pandas as pd
+
+    conditions = ["reader = ?"]
+    params = [reader_key(url)]
+    if committees:
+        conditions.append(f"committee IN ({', '.join('?' * len(committees))})")
+        params.extend(committees)
+    if doc_types:
+        conditions.append(f"doc_type IN ({', '.join('?' * len(doc_types))})")
+        params.extend(doc_types)
+    if date_range:
+        conditions.append("date_end >= ? AND date_start <= ?")
+        params.extend(value.isoformat() for value in date_range)
+
+    if not os.path.exists(db_path):
+        return _typed(pd.DataFrame(columns=CATALOG_FIELDS))
+    with _connect(db_path) as conn:
+        frame = pd.read_sql_query(
+            f"SELECT {', '.join(CATALOG_FIELDS)} FROM documents WHERE {' AND '.join(conditions)} "
+            "ORDER BY date_start, committee, item_number",
+            conn, params=params
+        )
+    return _typed(frame)
+
+def _typed(frame):
+    import pandas as pd
+
+    frame['committee'] = frame['committee'].fillna("").astype("category")
+    frame['doc_type'] = frame['doc_type'].fillna(OTHER_TYPE).astype("category")
+    for column in ("meeting_date", "date_start", "date_end"):
+        frame[column] = pd.to_datetime(frame[column], format="%Y-%m-%d")
+    frame['item_number'] = frame['item_number'].astype("Int64")
+    return frame
+
+def _connect(db_path):
+    return connect(db_path, _SCHEMA)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the document catalog of earlier crawls")
+    parser.add_argument("url", help="Reader URL the documents were crawled from")
+    parser.add_argument("--committee", action="append", default=[], help="Committee to include (repeatable)")
+    parser.add_argument("--type", action="append", default=[], help=f"Document type to include (repeatable): {', '.join(DOCUMENT_TYPES)}, {OTHER_TYPE}")
+    parser.add_argument("--from", dest="earliest", type=date.fromisoformat, help="Earliest document date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="latest", type=date.fromisoformat, help="Latest document date (YYYY-MM-DD)")
+    args = parser.parse_args(argv)
+
+    date_range = None
+    if args.earliest or args.latest:
+        date_range = (args.earliest or date(1970, 1, 1), args.latest or date.today())
+    catalog = load_catalog(args.url, args.committee, args.type, date_range)
+    catalog.to_csv(sys.stdout, index=False, date_format="%Y-%m-%d")
+    print(f"{len(catalog)} documents", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
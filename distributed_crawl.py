@@ -0,0 +1,417 @@
+"""
+Sharded crawl mode: worker processes (on this or other hosts sharing the
+database file) pull folder URLs from a SQLite work queue, dedupe through the
+queue's URL key and write partial results back. The coordinator assembles a
+result in the same format as get_netpublicator_pdf_filenames.
+
+Usage:
+    python distributed_crawl.py crawl URL --depth 3 --workers 4 [--db crawl.sqlite]
+    python distributed_crawl.py worker crawl.sqlite
+"""
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import tempfile
+import multiprocessing
+from datetime import date
+from rate_governor import get_governor, MAX_RATE
+from sqlite_store import connect
+from progress import ProgressBus, CrawlStarted, StatusMessage, FolderScanned, FolderFailed, CrawlFinished, legacy_callback_sink
+from downloader import (_create_driver, _load_page, _get_folder_info, _get_files_and_subfolders_current,
+                        _should_exclude_folder, _folder_matches_date_range, _scan_error_info, _record_path_index)
+
+# Upper bound on concurrent browsers against netpublicator.com, whatever the caller asks for
+MAX_WORKERS = 8
+
+# A claimed folder is handed to another worker if its worker has not finished it by then
+CLAIM_TIMEOUT = 120
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS tasks (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT UNIQUE,
+    path TEXT,
+    depth INTEGER,
+    inherit_dates TEXT,
+    status TEXT DEFAULT 'pending',
+    worker TEXT,
+    claimed_at REAL,
+    finished_at REAL,
+    queued INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, depth, seq);
+CREATE INDEX IF NOT EXISTS tasks_finished ON tasks (finished_at);
+CREATE TABLE IF NOT EXISTS files (task_seq INTEGER, position INTEGER, name TEXT, url TEXT, folder_location TEXT);
+CREATE INDEX IF NOT EXISTS files_task ON files (task_seq);
+CREATE TABLE IF NOT EXISTS subfolders (task_seq INTEGER, position INTEGER, name TEXT, url TEXT, path TEXT);
+CREATE TABLE IF NOT EXISTS excluded (task_seq INTEGER, position INTEGER, path TEXT, reason TEXT, url TEXT);
+CREATE TABLE IF NOT EXISTS errors (task_seq INTEGER, info TEXT);
+CREATE TABLE IF NOT EXISTS workers (worker TEXT PRIMARY KEY, sleep_time REAL DEFAULT 0);
+"""
+
+def crawl_distributed(url, search_depth=1, exclude_folders=None, date_filter=None, search_delay=0.7, workers=4, db_path=None, progress_callback=None, progress_sinks=None):
+    """
+    Crawl a folder tree with several worker processes sharing a SQLite work queue
+
+    Args:
+        url: Base URL to scan
+        search_depth: How many levels deep to search (0=current folder only)
+        exclude_folders: List of words/phrases to exclude from folder names
+        date_filter: Tuple of (earliest_date, latest_date) for date filtering
+        search_delay: Time to wait between page loads
+        workers: Number of local worker processes (capped at MAX_WORKERS)
+        db_path: Queue database; give a path on shared storage to let workers on other hosts join
+        progress_callback: Function to call with progress updates
+        progress_sinks: Extra progress.ProgressBus sinks that receive progress snapshots
+
+    Returns:
+        Dictionary in the same format as get_netpublicator_pdf_filenames
+    """
+    if exclude_folders is None:
+        exclude_folders = []
+    if date_filter is None:
+        date_filter = (date(1970, 1, 1), date.today())
+
+    temp_dir = None
+    if db_path is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(temp_dir.name, "crawl.sqlite")
+
+    init_queue(db_path, url, search_depth, exclude_folders, date_filter, search_delay, workers)
+
+    # Workers run in other processes, so the coordinator turns finished queue rows into folder events
+    progress_bus = ProgressBus(progress_sinks or [])
+    if progress_callback:
+        progress_bus.add_sink(legacy_callback_sink(progress_callback))
+    progress_bus.emit(CrawlStarted(url, search_depth))
+    reported = set()
+
+    processes = []
+    for _ in range(max(1, min(workers, MAX_WORKERS))):
+        process = multiprocessing.Process(target=run_worker, args=(db_path,), daemon=True)
+        process.start()
+        processes.append(process)
+
+    try:
+        while any(process.is_alive() for process in processes):
+            _report_finished_tasks(db_path, progress_bus, reported)
+            time.sleep(0.5)
+        for process in processes:
+            process.join()
+
+        # Workers on other hosts may still be finishing claimed folders; stop once nobody has held a claim for CLAIM_TIMEOUT
+        while not queue_finished(db_path) and _has_live_claims(db_path):
+            _report_finished_tasks(db_path, progress_bus, reported)
+            time.sleep(0.5)
+
+        unfinished = _fail_unfinished_tasks(db_path)
+        _report_finished_tasks(db_path, progress_bus, reported)
+        if unfinished and not _any_task_done(db_path):
+            with _connect(db_path) as conn:
+                failure = conn.execute("SELECT value FROM settings WHERE key = 'worker_failure'").fetchone()
+            reason = f": {json.loads(failure[0])}" if failure else ""
+            raise RuntimeError(f"No worker could scan any folder ({unfinished} folders left){reason}")
+
+        result = assemble_result(db_path)
+        _record_path_index(url, folder_listings(db_path), result['breadcrumb_links'])
+        progress_bus.emit(CrawlFinished(len(result['files']), len(result['error_folders']), len(result['excluded_folders']), search_depth))
+        progress_bus.emit(StatusMessage(f"Found {len(result['files'])} files", 1.0, final=True))
+        return result
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+def init_queue(db_path, url, search_depth, exclude_folders, date_filter, search_delay, workers=1):
+    """Create the queue database with the crawl settings and the root folder"""
+    conn = _connect(db_path)
+    conn.executescript(_SCHEMA)
+    conn.close()
+
+    with _connect(db_path) as conn:
+        settings = {
+            'root_url': url,
+            'max_depth': search_depth,
+            'exclude_folders': exclude_folders,
+            'date_filter': [date_filter[0].isoformat(), date_filter[1].isoformat()],
+            'search_delay': search_delay,
+            'workers': max(1, min(workers, MAX_WORKERS))
+        }
+        conn.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                         [(key, json.dumps(value)) for key, value in settings.items()])
+        conn.execute("INSERT OR IGNORE INTO tasks (url, path, depth) VALUES (?, '', 0)", (url,))
+
+def run_worker(db_path, worker_id=None):
+    """Scan folders from the queue until no work is left"""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    with _connect(db_path) as conn:
+        settings = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM settings")}
+    max_depth = settings['max_depth']
+    exclude_folders = settings['exclude_folders']
+    earliest_date, latest_date = (date.fromisoformat(value) for value in settings['date_filter'])
+    search_delay = settings['search_delay']
+
+    # Each worker process has its own governor, so split the host's budget between them
+    governor = get_governor()
+    governor.configure(initial_rate=governor.initial_rate / settings['workers'],
+                       min_rate=governor.min_rate / settings['workers'],
+                       max_rate=MAX_RATE / settings['workers'])
+
+    total_sleep_time = [0]
+    try:
+        driver = _create_driver()
+    except Exception as e:
+        # Let the coordinator report why its workers died instead of waiting for them
+        with _connect(db_path) as conn:
+            conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('worker_failure', ?)", (json.dumps(str(e)),))
+        raise
+    try:
+        while True:
+            task = _claim_task(db_path, worker_id)
+            if task is None:
+                if queue_finished(db_path):
+                    break
+                # Other workers still hold claims that may expand the tree
+                time.sleep(search_delay)
+                continue
+
+            seq, url, path_prefix, depth, inherit_dates = task
+            parent_dates = None
+            if inherit_dates:
+                parent_dates = tuple(date.fromisoformat(value) for value in json.loads(inherit_dates))
+
+            files, subfolders, excluded, children = [], [], [], []
+            try:
+                _load_page(driver, url, search_delay, total_sleep_time)
+                if depth == 0:
+                    folder_info = _get_folder_info(driver)
+                current_files, current_subfolders = _get_files_and_subfolders_current(driver)
+            except Exception as e:
+                with _connect(db_path) as conn:
+                    if _finish_task(conn, seq, worker_id, 'error'):
+                        conn.execute("INSERT INTO errors (task_seq, info) VALUES (?, ?)",
+                                     (seq, json.dumps(_scan_error_info(path_prefix, url, e))))
+                continue
+
+            for position, (filename, file_url, _) in enumerate(current_files):
+                if path_prefix:
+                    files.append((seq, position, f"{path_prefix}/{filename}", file_url, path_prefix))
+                else:
+                    files.append((seq, position, filename, file_url, "current"))
+
+            for position, (subfolder_name, subfolder_url, _) in enumerate(current_subfolders):
+                full_subfolder_path = f"{path_prefix}/{subfolder_name}" if path_prefix else subfolder_name
+
+                if _should_exclude_folder(subfolder_name, exclude_folders):
+                    excluded.append((seq, position, full_subfolder_path, "keyword", subfolder_url))
+                    continue
+
+                should_include, subfolder_dates = _folder_matches_date_range(subfolder_name, earliest_date, latest_date, parent_dates)
+                if not should_include:
+                    excluded.append((seq, position, full_subfolder_path, "date range", subfolder_url))
+                    continue
+
+                subfolders.append((seq, position, subfolder_name, subfolder_url, full_subfolder_path))
+                if depth < max_depth and subfolder_url and subfolder_url != url:
+                    dates_json = json.dumps([d.isoformat() for d in subfolder_dates]) if subfolder_dates else None
+                    children.append((subfolder_url, full_subfolder_path, depth + 1, dates_json))
+
+            with _connect(db_path) as conn:
+                # The claim may have expired and been finished by another worker; its rows win
+                if not _finish_task(conn, seq, worker_id, 'done'):
+                    continue
+                conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?)", files)
+                conn.executemany("INSERT INTO subfolders VALUES (?, ?, ?, ?, ?)", subfolders)
+                conn.executemany("INSERT INTO excluded VALUES (?, ?, ?, ?, ?)", excluded)
+                # The UNIQUE url column is the shared visited set
+                queued = conn.executemany("INSERT OR IGNORE INTO tasks (url, path, depth, inherit_dates) VALUES (?, ?, ?, ?)", children).rowcount
+                conn.execute("UPDATE tasks SET queued = ? WHERE seq = ?", (max(queued, 0), seq))
+                if depth == 0:
+                    conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('folder_info', ?)", (json.dumps(folder_info),))
+    finally:
+        driver.quit()
+        with _connect(db_path) as conn:
+            conn.execute("INSERT OR REPLACE INTO workers (worker, sleep_time) VALUES (?, ?)", (worker_id, total_sleep_time[0]))
+
+def queue_progress(db_path):
+    """Return (finished folders, known folders, files found)"""
+    with _connect(db_path) as conn:
+        done = conn.execute("SELECT COUNT(*) FROM tasks WHERE status IN ('done', 'error')").fetchone()[0]
+        total = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+        file_count = conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+    return done, total, file_count
+
+def queue_finished(db_path):
+    """Check if every queued folder has been scanned"""
+    with _connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM tasks WHERE status IN ('pending', 'claimed')").fetchone()[0] == 0
+
+def assemble_result(db_path):
+    """Build a get_netpublicator_pdf_filenames style result from the queue database"""
+    with _connect(db_path) as conn:
+        folder_info = conn.execute("SELECT value FROM settings WHERE key = 'folder_info'").fetchone()
+        if folder_info:
+            folder_display_name, folder_safe_name, breadcrumb_links = json.loads(folder_info[0])
+            breadcrumb_links = [tuple(link) for link in breadcrumb_links]
+        else:
+            folder_display_name, folder_safe_name, breadcrumb_links = "error_folder", "error_folder", []
+
+        # Folders are ordered by path so results read like a depth-first crawl
+        order = "JOIN tasks ON tasks.seq = task_seq ORDER BY tasks.path, position"
+        files = [tuple(row) for row in conn.execute(f"SELECT name, files.url, folder_location FROM files {order}")]
+        subfolders = [tuple(row) for row in conn.execute(f"SELECT name, subfolders.url, subfolders.path FROM subfolders {order}")]
+        excluded_rows = conn.execute(f"SELECT excluded.path, reason, excluded.url FROM excluded {order}").fetchall()
+        error_folders = [json.loads(row[0]) for row in conn.execute("SELECT info FROM errors ORDER BY task_seq")]
+        sleep_time = conn.execute("SELECT COALESCE(SUM(sleep_time), 0) FROM workers").fetchone()[0]
+
+    excluded_folder_urls = {path: folder_url for path, _, folder_url in excluded_rows}
+    excluded_folder_urls.update({path: folder_url for _, folder_url, path in subfolders})
+
+    return {
+        'files': files,
+        'subfolders': subfolders,
+        'folder_display_name': folder_display_name,
+        'folder_safe_name': folder_safe_name,
+        'breadcrumb_links': breadcrumb_links,
+        'error_folders': error_folders,
+        'excluded_folders': [f"{path} (excluded by {reason})" for path, reason, _ in excluded_rows],
+        'excluded_folder_urls': excluded_folder_urls,
+        'sleep_time': sleep_time
+    }
+
+def folder_listings(db_path):
+    """Return {folder path: (folder url, [(subfolder name, subfolder url), ...])} for every scanned folder"""
+    with _connect(db_path) as conn:
+        tasks = conn.execute("SELECT seq, path, url FROM tasks WHERE status = 'done'").fetchall()
+        children = conn.execute(
+            "SELECT task_seq, position, name, url, 0 FROM subfolders "
+            "UNION ALL SELECT task_seq, position, path, url, 1 FROM excluded ORDER BY task_seq, position"
+        ).fetchall()
+
+    listings = {seq: (path, folder_url, []) for seq, path, folder_url in tasks}
+    for seq, _, name, subfolder_url, by_path in children:
+        if seq in listings:
+            # Excluded folders are stored by path
+            listings[seq][2].append((name.split('/')[-1] if by_path else name, subfolder_url))
+    return {path: (folder_url, subfolders) for path, folder_url, subfolders in listings.values()}
+
+def iter_files(db_path):
+    """Yield (filename, url, folder_location) for every file found so far, without loading them all at once"""
+    conn = sqlite3.connect(db_path, timeout=60)
+    try:
+        cursor = conn.execute("SELECT name, files.url, folder_location FROM files JOIN tasks ON tasks.seq = task_seq ORDER BY tasks.path, position")
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for row in rows:
+                yield tuple(row)
+    finally:
+        conn.close()
+
+def _finish_task(conn, seq, worker_id, status):
+    """Mark a task finished if this worker still holds its claim; returns False if it does not"""
+    return conn.execute("UPDATE tasks SET status = ?, finished_at = ? WHERE seq = ? AND status = 'claimed' AND worker = ?",
+                        (status, time.time(), seq, worker_id)).rowcount == 1
+
+def _report_finished_tasks(db_path, progress_bus, reported):
+    """Emit FolderScanned/FolderFailed for the tasks finished since the last call"""
+    since = max((finished_at for _, finished_at in reported), default=0)
+    with _connect(db_path) as conn:
+        rows = conn.execute(
+            "SELECT seq, path, depth, status, queued, finished_at, (SELECT COUNT(*) FROM files WHERE task_seq = seq) "
+            "FROM tasks WHERE status IN ('done', 'error') AND finished_at >= ? ORDER BY finished_at",
+            (since,)
+        ).fetchall()
+    for seq, path, depth, status, queued, finished_at, file_count in rows:
+        if (seq, finished_at) in reported:
+            continue
+        reported.add((seq, finished_at))
+        if status == 'done':
+            progress_bus.emit(FolderScanned(path, depth, file_count, queued or 0))
+        else:
+            progress_bus.emit(FolderFailed(path, depth, "scan error"))
+
+def _has_live_claims(db_path):
+    """Check if some worker claimed a folder within the last CLAIM_TIMEOUT seconds"""
+    with _connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM tasks WHERE status = 'claimed' AND claimed_at >= ?",
+                            (time.time() - CLAIM_TIMEOUT,)).fetchone()[0] > 0
+
+def _any_task_done(db_path):
+    with _connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM tasks WHERE status = 'done'").fetchone()[0] > 0
+
+def _fail_unfinished_tasks(db_path):
+    """Record folders no worker finished as scan errors, returning how many there were"""
+    with _connect(db_path) as conn:
+        rows = conn.execute("SELECT seq, url, path FROM tasks WHERE status IN ('pending', 'claimed')").fetchall()
+        for seq, folder_url, path in rows:
+            conn.execute("INSERT INTO errors (task_seq, info) VALUES (?, ?)",
+                         (seq, json.dumps(_scan_error_info(path, folder_url, RuntimeError("no worker left to scan this folder")))))
+            conn.execute("UPDATE tasks SET status = 'error', finished_at = ? WHERE seq = ?", (time.time(), seq))
+    return len(rows)
+
+def _claim_task(db_path, worker_id):
+    """Atomically claim the shallowest pending folder (or one whose claim has expired)"""
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT seq, url, path, depth, inherit_dates FROM tasks "
+            "WHERE status = 'pending' OR (status = 'claimed' AND claimed_at < ?) "
+            "ORDER BY depth, seq LIMIT 1",
+            (time.time() - CLAIM_TIMEOUT,)
+        ).fetchone()
+        if row:
+            conn.execute("UPDATE tasks SET status = 'claimed', worker = ?, claimed_at = ? WHERE seq = ?",
+                         (worker_id, time.time(), row[0]))
+        conn.execute("COMMIT")
+        return row
+    finally:
+        conn.close()
+
+def _connect(db_path):
+    return connect(db_path, immediate=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sharded NetPublicator crawl")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    crawl_parser = subparsers.add_parser("crawl", help="Coordinate a crawl and print the result as JSON")
+    crawl_parser.add_argument("url")
+    crawl_parser.add_argument("--depth", type=int, default=1)
+    crawl_parser.add_argument("--workers", type=int, default=4)
+    crawl_parser.add_argument("--delay", type=float, default=0.7)
+    crawl_parser.add_argument("--exclude", default="", help="Comma-separated folder exclusion terms")
+    crawl_parser.add_argument("--db", help="Queue database path (use shared storage for multi-host crawls)")
+
+    worker_parser = subparsers.add_parser("worker", help="Join a running crawl as an extra worker")
+    worker_parser.add_argument("db")
+
+    args = parser.parse_args(argv)
+    if args.command == "worker":
+        run_worker(args.db)
+        return
+
+    exclusion_list = [term.strip().lower() for term in args.exclude.split(',') if term.strip()]
+    result = crawl_distributed(
+        args.url,
+        search_depth=args.depth,
+        exclude_folders=exclusion_list,
+        search_delay=args.delay,
+        workers=args.workers,
+        db_path=args.db,
+        progress_callback=lambda current, total, message: print(message, file=sys.stderr)
+    )
+    json.dump(result, sys.stdout, ensure_ascii=False, indent=1)
+
+if __name__ == "__main__":
+    main()
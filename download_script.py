@@ -0,0 +1,98 @@
+import json
+
+# Runtime shared by every generated script. Only the data array and the
+# settings object are prepended, so the script size grows with the URL
+# payload and not with per-file boilerplate.
+_RUNTIME = """
+const sleep=ms=>new Promise(r=>setTimeout(r,ms));
+let next=0,done=0,saved=0,gap=C.interval,nextStart=0;const failed=[];const t0=Date.now();
+async function pace(){const now=Date.now(),wait=Math.max(0,nextStart-now);nextStart=Math.max(now,nextStart)+gap;if(wait)await sleep(wait);}
+function save(blob,name){const a=document.createElement('a');a.href=URL.createObjectURL(blob);a.download=name;document.body.appendChild(a);a.click();a.remove();setTimeout(()=>URL.revokeObjectURL(a.href),60000);}
+async function get(url,name){
+for(let i=0;;i++){
+let status='';
+await pace();
+try{
+const r=await fetch(url,{credentials:'include'});
+status=r.status;
+const type=r.headers.get('content-type')||'';
+if(r.ok&&!type.includes('text/html')){gap=Math.max(C.interval,gap>50?gap*0.9:0);save(await r.blob(),name);return true;}
+if(r.ok)status='HTML instead of PDF';
+else if(!C.retryOn.includes(r.status))return false;
+}catch(e){status=e.message;}
+gap=Math.min(10000,Math.max(gap*2,250));
+if(i>=C.retries)return false;
+const wait=C.delay*2**i+Math.random()*C.delay;
+console.warn(`Retrying ${name} in ${(wait/1000).toFixed(1)}s (${status})`);
+await sleep(wait);
+}
+}
+async function worker(){
+while(next<D.length){
+const[url,name]=D[next++];
+const ok=await get(url,name);
+done++;
+if(ok)saved++;else failed.push([url,name]);
+console.log(`[${done}/${D.length}] ${ok?'Saved':'FAILED'} ${name} (${((Date.now()-t0)/1000).toFixed(1)}s)`);
+}
+}
+await Promise.all(Array.from({length:Math.min(C.concurrency,D.length)},worker));
+console.log(`Done: ${saved}/${D.length} files saved in ${((Date.now()-t0)/1000).toFixed(1)}s`);
+if(failed.length){
+console.warn(`${failed.length} files failed, opening them in new tabs instead:`,failed.map(f=>f[1]));
+failed.forEach(([url],i)=>setTimeout(()=>window.open(url),i*C.delay));
+}
+})();"""
+
+
+def generate_download_script(links, filenames=None, concurrency=4, max_retries=5, retry_delay_ms=1000, min_interval_ms=0):
+    """
+    Generate a compact browser console script that downloads files with a bounded concurrency pool
+
+    Args:
+        links: List of document URLs to download
+        filenames: Optional list of names to save each file as (same order as links)
+        concurrency: Maximum number of downloads in flight at once
+        max_retries: How many times to retry a file that answers with 503/429 or an HTML error page
+        retry_delay_ms: Base delay for exponential backoff between retries
+        min_interval_ms: Minimum time between starting two requests. With the default 0 requests
+            start as soon as a download slot is free; the script only spaces them out after the
+            server answers with errors, and lets the spacing decay back while it is healthy
+
+    Returns:
+        JavaScript source as a string
+    """
+    if filenames is None:
+        filenames = [None] * len(links)
+
+    data = []
+    for index, (link, filename) in enumerate(zip(links, filenames), 1):
+        data.append([link, _download_name(filename, index)])
+
+    config = {
+        "concurrency": max(1, int(concurrency)),
+        "retries": max(0, int(max_retries)),
+        "delay": max(0, int(retry_delay_ms)),
+        "interval": max(0, int(min_interval_ms)),
+        "retryOn": [429, 500, 502, 503, 504],
+    }
+
+    # Plain concatenation, so nothing in the file names is ever treated as a placeholder
+    return ("(async()=>{\nconst D=" + json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+            + ",C=" + json.dumps(config, separators=(",", ":")) + ";" + _RUNTIME)
+
+
+def _download_name(filename, index):
+    """Return a safe file name to save a document as"""
+    if not filename:
+        return f"document_{index}.pdf"
+
+    # Keep only the file part of "folder/sub/file" display names
+    name = filename.split('/')[-1].strip()
+    for char in '<>:"\\|?*':
+        name = name.replace(char, "_")
+    if not name:
+        return f"document_{index}.pdf"
+    if not name.lower().endswith(".pdf"):
+        name += ".pdf"
+    return name
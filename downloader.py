@@ -1,12 +1,19 @@
 import os
 import time
 import re
+import threading
 from datetime import datetime, date
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
+from rate_governor import get_governor
+from progress import (ProgressBus, CrawlStarted, StatusMessage, FolderStarted, FolderScanned, FolderFailed,
+                      FolderSkipped, CrawlFinished, legacy_callback_sink)
 
-def get_netpublicator_pdf_filenames(url, include_subfolders=False, search_depth=1, exclude_folders=None, date_filter=None, search_delay=0.7, progress_callback=None):
+# Selenium is imported when the first browser starts, so importing this module stays cheap.
+# A browser started by prespawn_driver() is handed to the first crawl in the same process.
+_prespawn = {'driver': None, 'pid': None, 'thread': None}
+_prespawn_lock = threading.Lock()
+_startup_timings = {}
+
+def get_netpublicator_pdf_filenames(url, include_subfolders=False, search_depth=1, exclude_folders=None, date_filter=None, search_delay=0.7, progress_callback=None, progress_sinks=None):
     """
     Get PDF filenames from NetPublicator with optional subfolder scanning
     
@@ -17,7 +24,8 @@ def get_netpublicator_pdf_filenames(url, include_subfolders=False, search_depth=
         exclude_folders: List of words/phrases to exclude from folder names
         date_filter: Tuple of (earliest_date, latest_date) for date filtering
         search_delay: Time to wait between page loads (0.3=Turbo, 0.7=Normal, 2.0=Slow)
-        progress_callback: Function to call with progress updates
+        progress_callback: Function to call with progress updates (called a few times per second at most)
+        progress_sinks: Extra progress.ProgressBus sinks that receive progress snapshots
     
     Returns:
         Dictionary with files, subfolders, folder info, error info, etc.
@@ -27,38 +35,27 @@ def get_netpublicator_pdf_filenames(url, include_subfolders=False, search_depth=
     if date_filter is None:
         date_filter = (date(1970, 1, 1), date.today())
 
+    progress_bus = ProgressBus(progress_sinks or [])
+    if progress_callback:
+        progress_bus.add_sink(legacy_callback_sink(progress_callback))
+
     # Initialize time tracking
     total_sleep_time = [0]  # Use list to make it mutable
     start_time = time.time()
 
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-
-    driver = webdriver.Chrome(options=chrome_options)
+    driver = _create_driver()
     
     try:
-        if progress_callback:
-            progress_callback(0, 100, "Loading page...")
+        progress_bus.emit(StatusMessage("Loading page...", 0.0))
         
-        driver.get(url)
-        
-        # Log intentional sleep time with configurable delay
-        sleep_start = time.time()
-        time.sleep(search_delay)
-        sleep_duration = time.time() - sleep_start
-        total_sleep_time[0] += sleep_duration
+        _load_page(driver, url, search_delay, total_sleep_time)
 
-        if progress_callback:
-            progress_callback(20, 100, "Analyzing page structure...")
+        progress_bus.emit(StatusMessage("Analyzing page structure...", 0.2))
 
         # Get folder information from breadcrumb
         folder_display_name, folder_safe_name, breadcrumb_links = _get_folder_info(driver)
 
-        if progress_callback:
-            progress_callback(40, 100, "Scanning files...")
+        progress_bus.emit(StatusMessage("Scanning files...", 0.4))
 
         # Get files and subfolders based on search parameters
         if not include_subfolders:
@@ -66,17 +63,20 @@ def get_netpublicator_pdf_filenames(url, include_subfolders=False, search_depth=
             error_folders = []
             excluded_folders = []
             excluded_folder_urls = {}
+            folder_listings = {"": (url, [(name, subfolder_url) for name, subfolder_url, _ in subfolders])}
         else:
+            folder_listings = {}
             files, subfolders, error_folders, excluded_folders, excluded_folder_urls = _get_files_and_subfolders_multilevel(
-                driver, url, search_depth, progress_callback, total_sleep_time, exclude_folders, date_filter, search_delay
+                driver, url, search_depth, progress_bus, total_sleep_time, exclude_folders, date_filter, search_delay,
+                folder_listings=folder_listings
             )
         
-        if progress_callback:
-            progress_callback(100, 100, f"Found {len(files)} files")
+        _record_path_index(url, folder_listings, breadcrumb_links)
+        
+        progress_bus.emit(StatusMessage(f"Found {len(files)} files", 1.0, final=True))
         
     except Exception as e:
-        if progress_callback:
-            progress_callback(100, 100, f"Error: {e}")
+        progress_bus.emit(StatusMessage(f"Error: {e}", 1.0, final=True))
         return {
             'files': [],
             'subfolders': [],
@@ -104,8 +104,203 @@ def get_netpublicator_pdf_filenames(url, include_subfolders=False, search_depth=
         'sleep_time': total_sleep_time[0]
     }
 
+def expand_netpublicator_folder(url, path_prefix, search_depth=0, exclude_folders=None, date_filter=None, search_delay=0.7, progress_callback=None, progress_sinks=None):
+    """
+    Scan one folder (and optionally its subfolders) found by an earlier search
+    
+    Args:
+        url: URL of the folder to scan
+        path_prefix: Folder path of the folder in the earlier result (e.g. "Regionfullmäktige/År 2024")
+        search_depth: How many levels below the folder to search (0=the folder only)
+        exclude_folders: List of words/phrases to exclude from folder names
+        date_filter: Tuple of (earliest_date, latest_date) for date filtering
+        search_delay: Time to wait between page loads
+        progress_callback: Function to call with progress updates
+        progress_sinks: Extra progress.ProgressBus sinks that receive progress snapshots
+    
+    Returns:
+        Dictionary in the same format as get_netpublicator_pdf_filenames, with all
+        file locations and subfolder paths below path_prefix
+    """
+    if exclude_folders is None:
+        exclude_folders = []
+    if date_filter is None:
+        date_filter = (date(1970, 1, 1), date.today())
+
+    progress_bus = ProgressBus(progress_sinks or [])
+    if progress_callback:
+        progress_bus.add_sink(legacy_callback_sink(progress_callback))
+
+    total_sleep_time = [0]
+    folder_listings = {}
+    driver = _create_driver()
+    
+    try:
+        files, subfolders, error_folders, excluded_folders, excluded_folder_urls = _get_files_and_subfolders_multilevel(
+            driver, url, search_depth, progress_bus, total_sleep_time, exclude_folders, date_filter, search_delay,
+            path_prefix=path_prefix, parent_dates=_inherited_dates(path_prefix), folder_listings=folder_listings
+        )
+    finally:
+        driver.quit()
+    
+    _record_path_index(url, folder_listings, start_path=path_prefix)
+    
+    return {
+        'files': files,
+        'subfolders': subfolders,
+        'error_folders': error_folders,
+        'excluded_folders': excluded_folders,
+        'excluded_folder_urls': excluded_folder_urls,
+        'sleep_time': total_sleep_time[0]
+    }
+
+def get_indexed_pdf_filenames(url, folder_path="", search_depth=0, exclude_folders=None, date_filter=None, search_delay=0.7, progress_callback=None, progress_sinks=None):
+    """
+    Search only the folders matching a folder path or date range, found through the path index
+    
+    Instead of crawling down from url, the folders to search are looked up in the path index
+    (path_index.py) that every search fills in. Folder pages are only loaded where the index
+    does not know the subfolders yet, so repeating a lookup costs one page load per folder found.
+    In date mode only folders whose dates lie within date_filter are searched, so files lying
+    directly in the folders walked through on the way (e.g. "År 2024" for a June filter) are left out.
+    
+    Args:
+        url: URL of the folder to start from
+        folder_path: Folder path below url, e.g. "Regionfullmäktige/År 2024/2024-06-12" (the end
+            of a path is enough if that folder is already indexed). Empty to pick the folders by date_filter
+        search_depth: How many levels below each matching folder to search (0=the folder only)
+        exclude_folders: List of words/phrases to exclude from folder names
+        date_filter: Tuple of (earliest_date, latest_date) for date filtering
+        search_delay: Time to wait between page loads
+        progress_callback: Function to call with progress updates
+        progress_sinks: Extra progress.ProgressBus sinks that receive progress snapshots
+    
+    Returns:
+        Dictionary in the same format as get_netpublicator_pdf_filenames with paths relative to url,
+        plus 'target_folders' with the paths of the folders that were searched and 'path_index_error'
+        (None, or why the path index could not be used)
+    """
+    import path_index
+
+    if exclude_folders is None:
+        exclude_folders = []
+    if date_filter is None:
+        date_filter = (date(1970, 1, 1), date.today())
+
+    progress_bus = ProgressBus(progress_sinks or [])
+    if progress_callback:
+        progress_bus.add_sink(legacy_callback_sink(progress_callback))
+
+    total_sleep_time = [0]
+    driver = _create_driver()
+
+    def list_folder(entry):
+        # One page load records the folder's subfolders in the index
+        _load_page(driver, entry['url'], search_delay, total_sleep_time)
+        _, subfolders = _get_files_and_subfolders_current(driver)
+        _record_path_index(entry['url'], {"": (entry['url'], [(name, subfolder_url) for name, subfolder_url, _ in subfolders])})
+
+    files, subfolders, error_folders, excluded_folders, excluded_folder_urls = [], [], [], [], {}
+    try:
+        progress_bus.emit(StatusMessage("Looking up folders in the path index...", 0.0))
+
+        start = path_index.lookup_url(url)
+        if start is None:
+            _load_page(driver, url, search_delay, total_sleep_time)
+            breadcrumb_links = _get_folder_info(driver)[2]
+            _, start_subfolders = _get_files_and_subfolders_current(driver)
+            _record_path_index(url, {"": (url, [(name, subfolder_url) for name, subfolder_url, _ in start_subfolders])}, breadcrumb_links)
+            start = path_index.lookup_url(url)
+        path_index_error = None
+        if start is None and not folder_path:
+            # Without a breadcrumb the folder cannot be placed in the index; the date filter works on a full crawl too
+            driver.quit()
+            driver = None
+            result = get_netpublicator_pdf_filenames(url, search_depth > 0, search_depth, exclude_folders, date_filter, search_delay,
+                                                     progress_callback, progress_sinks)
+            result['target_folders'] = [""]
+            result['path_index_error'] = "The folder's breadcrumb could not be read, so the whole folder was searched instead of using the path index"
+            return result
+
+        if start is None:
+            # A folder path cannot be resolved without knowing where url is, and searching everything would ignore it
+            targets = []
+            path_index_error = f"The folder's breadcrumb could not be read, so \"{folder_path}\" could not be resolved. Search without a folder path instead."
+        elif folder_path:
+            targets = path_index.resolve_path(start, folder_path, list_folder)
+        else:
+            targets = path_index.plan_date_targets(start, date_filter[0], date_filter[1], list_folder)
+
+        target_paths = []
+        for target in targets:
+            target_path = path_index.relative_path(target, start)
+            if any(_should_exclude_folder(name, exclude_folders) for name in path_index.split_path(target_path)):
+                excluded_folders.append(f"{target_path} (excluded by keyword)")
+                continue
+            # Folders below another target are covered by its search
+            if any(target_path.startswith(f"{other}/") for other, _ in target_paths if other):
+                continue
+            target_paths.append((target_path, target))
+
+        # One crawl with every target folder as a root, so the progress bar and ETA cover all of them
+        progress_bus.emit(CrawlStarted(url, search_depth, roots=len(target_paths)))
+        for target_path, target in target_paths:
+            folder_listings = {}
+            target_result = _get_files_and_subfolders_multilevel(
+                driver, target['url'], search_depth, progress_bus, total_sleep_time, exclude_folders, date_filter, search_delay,
+                path_prefix=target_path, parent_dates=_inherited_dates(target['path']), folder_listings=folder_listings,
+                crawl_events=False
+            )
+            files.extend(target_result[0])
+            subfolders.extend(target_result[1])
+            error_folders.extend(target_result[2])
+            excluded_folders.extend(target_result[3])
+            excluded_folder_urls.update(target_result[4])
+            _record_path_index(target['url'], folder_listings, start_path=target_path)
+        progress_bus.emit(CrawlFinished(len(files), len(error_folders), len(excluded_folders), search_depth))
+
+        progress_bus.emit(StatusMessage(f"Found {len(files)} files in {len(target_paths)} folders", 1.0, final=True))
+        if start is not None:
+            breadcrumb_links = path_index.get_breadcrumb(start)
+    finally:
+        if driver is not None:
+            driver.quit()
+
+    return {
+        'files': files,
+        'subfolders': subfolders,
+        'folder_display_name': " > ".join(text for text, _ in breadcrumb_links) or "default_folder",
+        'folder_safe_name': "_".join(text for text, _ in breadcrumb_links) or "default_folder",
+        'breadcrumb_links': breadcrumb_links,
+        'error_folders': error_folders,
+        'excluded_folders': excluded_folders,
+        'excluded_folder_urls': excluded_folder_urls,
+        'sleep_time': total_sleep_time[0],
+        'target_folders': [target_path for target_path, _ in target_paths],
+        'path_index_error': path_index_error
+    }
+
+def _record_path_index(url, folder_listings, breadcrumb_links=None, start_path=""):
+    """Add the folders seen by a crawl to the path index; a failure here never fails the search"""
+    from path_index import record_crawl
+    try:
+        record_crawl(url, folder_listings, breadcrumb_links, start_path)
+    except Exception as e:
+        print(f"[PATH INDEX] Could not record folders: {e}")
+
+def _inherited_dates(folder_path):
+    """Return the exact dates a folder inherits from its path, like a full crawl would pass down"""
+    inherit_dates = None
+    for folder_name in folder_path.split('/'):
+        if not folder_name:
+            continue
+        _, inherit_dates = _folder_matches_date_range(folder_name, date(1970, 1, 1), date.today(), inherit_dates)
+    return inherit_dates
+
 def _get_folder_info(driver):
     """Extract folder information from breadcrumb"""
+    from selenium.webdriver.common.by import By
+
     folder_display_name = ""
     folder_safe_name = ""
     breadcrumb_links = []
@@ -138,8 +333,103 @@ def _get_folder_info(driver):
     
     return folder_display_name, folder_safe_name, breadcrumb_links
 
+def prespawn_driver():
+    """Start a browser in the background that the next crawl in this process can adopt"""
+    with _prespawn_lock:
+        if _prespawn['thread'] is not None or _prespawn['driver'] is not None:
+            return
+        _prespawn['thread'] = threading.Thread(target=_prespawn_worker, name="prespawn-driver", daemon=True)
+        _prespawn['thread'].start()
+
+def _prespawn_worker():
+    try:
+        driver = _launch_driver()
+    except Exception as e:
+        print(f"[STARTUP] Could not pre-start browser: {e}")
+        driver = None
+    with _prespawn_lock:
+        _prespawn['driver'] = driver
+        _prespawn['pid'] = os.getpid()
+        _prespawn['thread'] = None
+
+def record_startup_phase(phase, seconds):
+    """Record how long a startup phase took"""
+    _startup_timings[phase] = seconds
+    print(f"[STARTUP] {phase}: {seconds:.2f}s")
+
+def get_startup_timings():
+    """Return {phase: seconds} for the startup phases recorded so far"""
+    return dict(_startup_timings)
+
+def _create_driver():
+    """Return a headless Chrome browser, adopting the pre-started one if there is one"""
+    with _prespawn_lock:
+        thread = _prespawn['thread']
+    if thread is not None:
+        # Waiting for the browser that is already starting beats starting a second one
+        wait_start = time.time()
+        thread.join()
+        record_startup_phase("wait_for_prespawned_browser", time.time() - wait_start)
+    
+    with _prespawn_lock:
+        driver = _prespawn['driver']
+        # A forked worker process must not take over its parent's browser
+        if driver is not None and _prespawn['pid'] == os.getpid():
+            _prespawn['driver'] = None
+        else:
+            driver = None
+    
+    if driver is not None:
+        try:
+            driver.current_url
+            return driver
+        except Exception:
+            # The pre-started browser died while waiting to be used
+            try:
+                driver.quit()
+            except Exception:
+                pass
+    
+    return _launch_driver()
+
+def _launch_driver():
+    """Start a headless Chrome browser"""
+    import_start = time.time()
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    if "selenium_import" not in _startup_timings:
+        record_startup_phase("selenium_import", time.time() - import_start)
+
+    launch_start = time.time()
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+
+    driver = webdriver.Chrome(options=chrome_options)
+    if "browser_start" not in _startup_timings:
+        record_startup_phase("browser_start", time.time() - launch_start)
+    return driver
+
+def _load_page(driver, url, search_delay, total_sleep_time):
+    """Load a page and wait for it to render"""
+    with get_governor().lease(url) as lease:
+        driver.get(url)
+        # NetPublicator's overload page has no distinct status code visible to Selenium
+        if "503" in (driver.title or ""):
+            lease.status = 503
+    
+    # Log intentional sleep time with configurable delay
+    sleep_start = time.time()
+    time.sleep(search_delay)
+    sleep_duration = time.time() - sleep_start
+    total_sleep_time[0] += sleep_duration
+
 def _get_files_and_subfolders_current(driver):
     """Get files and subfolders from current page only"""
+    from selenium.webdriver.common.by import By
+
     files = []
     subfolders = []
     
@@ -175,8 +465,14 @@ def _get_files_and_subfolders_current(driver):
     
     return files, subfolders
 
-def _get_files_and_subfolders_multilevel(driver, base_url, max_depth, progress_callback=None, total_sleep_time=None, exclude_folders=None, date_filter=None, search_delay=0.7):
-    """Get files from current folder and multiple levels of subfolders"""
+def _get_files_and_subfolders_multilevel(driver, base_url, max_depth, progress_bus=None, total_sleep_time=None, exclude_folders=None, date_filter=None, search_delay=0.7, path_prefix="", parent_dates=None, folder_listings=None, crawl_events=True):
+    """
+    Get files from current folder and multiple levels of subfolders
+    
+    If folder_listings is a dictionary, {folder path: (folder url, [(subfolder name, subfolder url), ...])}
+    is added to it for every folder scanned, for the path index. With crawl_events=False the caller
+    emits CrawlStarted/CrawlFinished itself, e.g. once for several start folders.
+    """
     all_files = []
     all_subfolders = []
     visited_urls = set()
@@ -194,37 +490,26 @@ def _get_files_and_subfolders_multilevel(driver, base_url, max_depth, progress_c
     
     earliest_date, latest_date = date_filter
 
-    def should_exclude_folder(folder_name):
-        """Check if folder should be excluded based on exclusion list"""
-        folder_name_lower = folder_name.lower()
-        for exclude_term in exclude_folders:
-            if exclude_term in folder_name_lower:
-                return True
-        return False
-    
     def scan_folder_recursive(url, current_depth, path_prefix="", parent_dates=None):
         if current_depth > max_depth or url in visited_urls:
+            if progress_bus:
+                progress_bus.emit(FolderSkipped(path_prefix, current_depth))
             return
         
         visited_urls.add(url)
         
-        if progress_callback:
-            if current_depth == 0:
-                progress_callback(50, 100, f"Files found: {len(all_files)} - Scanning main folder...")
-            else:
-                progress_callback(50 + (40 * current_depth / max_depth), 100, f"Files found: {len(all_files)} - Scanning: {path_prefix}")
+        if progress_bus:
+            progress_bus.emit(FolderStarted(path_prefix, current_depth))
         
+        folders_to_scan = []
         try:
-            driver.get(url)
-            
-            # Log intentional sleep time for subfolder scanning with configurable delay
-            sleep_start = time.time()
-            time.sleep(search_delay)  # Use configurable delay
-            sleep_duration = time.time() - sleep_start
-            total_sleep_time[0] += sleep_duration
+            _load_page(driver, url, search_delay, total_sleep_time)
             
             current_files, current_subfolders = _get_files_and_subfolders_current(driver)
             
+            if folder_listings is not None:
+                folder_listings[path_prefix] = (url, [(name, subfolder_url) for name, subfolder_url, _ in current_subfolders])
+            
             # Add files with path prefix
             for filename, file_url, _ in current_files:
                 if path_prefix:
@@ -235,17 +520,6 @@ def _get_files_and_subfolders_multilevel(driver, base_url, max_depth, progress_c
                     folder_location = "current"
                 all_files.append((display_name, file_url, folder_location))
             
-            # Update progress with results for this folder
-            if progress_callback:
-                file_count = len(current_files)
-                if file_count > 0:
-                    progress_callback(50 + (40 * current_depth / max_depth), 100, f"Found {file_count} files in: {path_prefix} (Total: {len(all_files)})")
-                else:
-                    if current_depth == 0:
-                        progress_callback(50 + (40 * current_depth / max_depth), 100, f"No files in main folder (Total: {len(all_files)})")
-                    else:
-                        progress_callback(50 + (40 * current_depth / max_depth), 100, f"No files in: {path_prefix} (Total: {len(all_files)})")
-            
             # Process subfolders
             for subfolder_name, subfolder_url, _ in current_subfolders:
                 if path_prefix:
@@ -257,7 +531,7 @@ def _get_files_and_subfolders_multilevel(driver, base_url, max_depth, progress_c
                 excluded_folder_urls[full_subfolder_path] = subfolder_url
                 
                 # Check if this subfolder should be excluded by keyword
-                if should_exclude_folder(subfolder_name):
+                if _should_exclude_folder(subfolder_name, exclude_folders):
                     excluded_folders.append(f"{full_subfolder_path} (excluded by keyword)")
                     print(f"[EXCLUDED] Skipping folder: {full_subfolder_path} (contains excluded term)")
                     continue
@@ -272,50 +546,73 @@ def _get_files_and_subfolders_multilevel(driver, base_url, max_depth, progress_c
                 # If we get here, the folder is not excluded, so add it to all_subfolders
                 all_subfolders.append((subfolder_name, subfolder_url, full_subfolder_path))
                 
-                # Recursively scan if we haven't reached max depth
+                # Queue for scanning if we haven't reached max depth
                 if current_depth < max_depth and subfolder_url and subfolder_url != url:
-                    scan_folder_recursive(subfolder_url, current_depth + 1, full_subfolder_path, inherit_dates)
+                    folders_to_scan.append((subfolder_url, full_subfolder_path, inherit_dates))
                         
         except Exception as e:
-            error_message = str(e)
-            folder_name = path_prefix if path_prefix else "main folder"
-            
-            if "stale element reference" in error_message:
-                error_folders.append({
-                    "folder": folder_name,
-                    "url": url,  # Add the URL here
-                    "error_type": "Stale element reference",
-                    "suggestion": "Try increasing loading time"
-                })
-            else:
-                error_folders.append({
-                    "folder": folder_name,
-                    "url": url,  # Add the URL here
-                    "error_type": "Other error",
-                    "suggestion": "Check folder accessibility"
-                })
+            error_folders.append(_scan_error_info(path_prefix, url, e))
             
-            if progress_callback:
-                progress_callback(50 + (40 * current_depth / max_depth), 100, f"Error scanning: {path_prefix} (Total: {len(all_files)})")
+            if progress_bus:
+                progress_bus.emit(FolderFailed(path_prefix, current_depth, str(e)))
+            return
+        
+        # Report this folder before descending, so the frontier (and ETA) includes its subfolders
+        if progress_bus:
+            progress_bus.emit(FolderScanned(path_prefix, current_depth, len(current_files), len(folders_to_scan)))
+        
+        for subfolder_url, full_subfolder_path, inherit_dates in folders_to_scan:
+            scan_folder_recursive(subfolder_url, current_depth + 1, full_subfolder_path, inherit_dates)
     
     # Start recursive scanning
-    scan_folder_recursive(base_url, 0)
+    if progress_bus and crawl_events:
+        progress_bus.emit(CrawlStarted(base_url, max_depth))
+    scan_folder_recursive(base_url, 0, path_prefix, parent_dates)
     
-    if progress_callback:
-        excluded_info = f" ({len(excluded_folders)} folders excluded)" if excluded_folders else ""
-        if error_folders:
-            progress_callback(100, 100, f"Scan complete! Found {len(all_files)} files across {max_depth} levels ({len(error_folders)} folders had errors{excluded_info})")
-        else:
-            progress_callback(100, 100, f"Scan complete! Found {len(all_files)} files across {max_depth} levels{excluded_info}")
+    if progress_bus and crawl_events:
+        progress_bus.emit(CrawlFinished(len(all_files), len(error_folders), len(excluded_folders), max_depth))
     
     return all_files, all_subfolders, error_folders, excluded_folders, excluded_folder_urls
 
+def _should_exclude_folder(folder_name, exclude_folders):
+    """Check if folder should be excluded based on exclusion list"""
+    folder_name_lower = folder_name.lower()
+    for exclude_term in exclude_folders:
+        if exclude_term in folder_name_lower:
+            return True
+    return False
+
+def _scan_error_info(path_prefix, url, error):
+    """Describe a folder that could not be scanned"""
+    folder_name = path_prefix if path_prefix else "main folder"
+    
+    if "stale element reference" in str(error):
+        return {
+            "folder": folder_name,
+            "url": url,
+            "error_type": "Stale element reference",
+            "suggestion": "Try increasing loading time"
+        }
+    return {
+        "folder": folder_name,
+        "url": url,
+        "error_type": "Other error",
+        "suggestion": "Check folder accessibility"
+    }
+
 def get_folder_depth(folder_path):
     """Calculate the depth of a folder based on path separators"""
     if folder_path == "current":
         return 0
     return folder_path.count('/') + 1
 
+def get_document_hash(file_url):
+    """Return the document key from the hash= parameter of a document URL"""
+    match = re.search(r'[?&]hash=([^&#]+)', file_url or "")
+    if match:
+        return match.group(1)
+    return file_url
+
 def get_indent_for_depth(depth):
     """Return indentation width based on folder depth"""
     if depth <= 1:
@@ -326,14 +623,21 @@ def get_indent_for_depth(depth):
 def _parse_folder_dates(folder_name):
     """
     Parse start and end dates from folder names based on various patterns
-    Returns (start_date, end_date) as date objects
+    Returns (start_date, end_date) as date objects; undated folders get the full range up to today
+    """
+    return _parse_folder_date_range(folder_name) or (date(1970, 1, 1), date.today())
+
+def _parse_folder_date_range(folder_name):
+    """
+    Parse start and end dates from folder names based on various patterns
+    Returns (start_date, end_date) as date objects, or None if the folder name has no recognizable date
     """
     from datetime import date
     import re
     
-    # Exception: folders with fr.o.m or t.o.m should fallback to default range
+    # Exception: folders with fr.o.m or t.o.m count as undated
     if 'fr.o.m' in folder_name.lower() or 't.o.m' in folder_name.lower():
-        return date(1970, 1, 1), date.today()
+        return None
     
     # Pattern 1: YYYY-MM-DD (exact date)
     pattern_exact = r'\b(\d{4}-\d{2}-\d{2})\b'
@@ -382,7 +686,7 @@ def _parse_folder_dates(folder_name):
             pass
     
     # Default: no recognizable date pattern found
-    return date(1970, 1, 1), date.today()
+    return None
 
 def _folder_matches_date_range(folder_name, earliest_date, latest_date, parent_folder_dates=None):
     """
@@ -0,0 +1,150 @@
+"""
+Export crawl results as document records in JSONL, CSV or Parquet.
+
+Usage:
+    python distributed_crawl.py crawl URL --depth 2 > result.json
+    python exporter.py result.json documents.parquet
+"""
+import io
+import sys
+import csv
+import json
+import argparse
+from downloader import get_document_hash, get_folder_depth, _parse_folder_date_range
+
+RECORD_FIELDS = ["name", "folder_path", "depth", "url", "document_hash", "folder_start_date", "folder_end_date"]
+
+# Records are written this many at a time, so memory use does not grow with the archive
+CHUNK_SIZE = 5000
+
+def iter_document_records(files):
+    """
+    Turn crawled files into flat document records
+
+    Args:
+        files: Iterable of (filename, url, folder_location) tuples, e.g. result['files'] from
+            get_netpublicator_pdf_filenames or a streaming source such as distributed_crawl.iter_files
+
+    Yields:
+        Dictionary per document with the fields in RECORD_FIELDS
+    """
+    dates_by_folder = {}
+    for fname, file_url, folder_location in files:
+        folder_path = "" if folder_location == "current" else folder_location
+        if folder_path not in dates_by_folder:
+            dates_by_folder[folder_path] = folder_date_range(folder_path)
+        start_date, end_date = dates_by_folder[folder_path]
+
+        yield {
+            'name': fname.split('/')[-1] if '/' in fname else fname,
+            'folder_path': folder_path,
+            'depth': get_folder_depth(folder_location),
+            'url': file_url,
+            'document_hash': get_document_hash(file_url),
+            'folder_start_date': start_date.isoformat() if start_date else None,
+            'folder_end_date': end_date.isoformat() if end_date else None
+        }
+
+def folder_date_range(folder_path):
+    """
+    Return the (start, end) dates of the innermost dated folder in a folder path
+
+    Returns (None, None) if no folder in the path has a recognizable date.
+    """
+    start_date, end_date = None, None
+    for folder_name in folder_path.split('/'):
+        if not folder_name:
+            continue
+        folder_dates = _parse_folder_date_range(folder_name)
+        if folder_dates is not None:
+            start_date, end_date = folder_dates
+    return start_date, end_date
+
+def export_jsonl(records, fp):
+    """Write records to a text file object as JSON lines, returning the number written"""
+    count = 0
+    for chunk in _chunks(records, CHUNK_SIZE):
+        fp.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in chunk))
+        count += len(chunk)
+    return count
+
+def export_csv(records, fp):
+    """Write records to a text file object as CSV, returning the number written"""
+    writer = csv.DictWriter(fp, fieldnames=RECORD_FIELDS)
+    writer.writeheader()
+    count = 0
+    for chunk in _chunks(records, CHUNK_SIZE):
+        writer.writerows(chunk)
+        count += len(chunk)
+    return count
+
+def export_parquet(records, path_or_file):
+    """Write records to a Parquet file one row group per chunk, returning the number written"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("name", pa.string()),
+        ("folder_path", pa.string()),
+        ("depth", pa.int32()),
+        ("url", pa.string()),
+        ("document_hash", pa.string()),
+        ("folder_start_date", pa.string()),
+        ("folder_end_date", pa.string())
+    ])
+    count = 0
+    with pq.ParquetWriter(path_or_file, schema) as writer:
+        for chunk in _chunks(records, CHUNK_SIZE):
+            columns = {field: [record[field] for record in chunk] for field in RECORD_FIELDS}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            count += len(chunk)
+    return count
+
+def export_to_bytes(files, export_format):
+    """Export crawled files in memory for a download button ("jsonl", "csv" or "parquet")"""
+    records = iter_document_records(files)
+    if export_format == "parquet":
+        buffer = io.BytesIO()
+        export_parquet(records, buffer)
+        return buffer.getvalue()
+
+    buffer = io.StringIO(newline="")
+    if export_format == "csv":
+        export_csv(records, buffer)
+    else:
+        export_jsonl(records, buffer)
+    return buffer.getvalue().encode("utf-8")
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a crawl result to JSONL, CSV or Parquet")
+    parser.add_argument("result", help="Crawl result JSON file (as printed by distributed_crawl.py), or a crawl queue database (.sqlite)")
+    parser.add_argument("output", help="Output file; the format follows the extension (.jsonl, .csv, .parquet)")
+    args = parser.parse_args(argv)
+
+    if args.result.endswith((".sqlite", ".db")):
+        from distributed_crawl import iter_files
+        files = iter_files(args.result)
+    else:
+        with open(args.result, encoding="utf-8") as f:
+            files = [tuple(entry) for entry in json.load(f)['files']]
+
+    records = iter_document_records(files)
+    if args.output.endswith(".parquet"):
+        count = export_parquet(records, args.output)
+    else:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            count = export_csv(records, f) if args.output.endswith(".csv") else export_jsonl(records, f)
+    print(f"Exported {count} documents to {args.output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+JSON files shared by all app sessions and CLI runs.
+
+write_json replaces a file through a temp file of its own, so two writers
+never write into the same temp file. file_lock serializes read-merge-write
+updates between threads, and between processes where fcntl is available.
+"""
+import os
+import json
+import uuid
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sessions of one server process are still serialized by the thread lock
+    fcntl = None
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+def write_json(path, data, indent=None):
+    """Write data to path atomically"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex[:12]}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+@contextmanager
+def file_lock(path):
+    """Hold the lock of path (a "<path>.lock" file next to it) while the block runs"""
+    with _locks_guard:
+        lock = _locks.setdefault(os.path.abspath(path), threading.Lock())
+    with lock:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,476 @@
+"""
+Concurrent-session load test for the Streamlit app.
+
+Starts a local fixture NetPublicator server and runs N simulated sessions of
+app.py at the same time, each doing search -> filter -> select -> generate
+with streamlit.testing. Reports latency percentiles per interaction, the peak
+number of browsers, and RSS per session, for each number of sessions given.
+
+Each session runs in its own process, because AppTest can only run one script
+at a time per process. The sessions split the per-host request budget between
+them, like the sessions of one Streamlit server share its rate governor, and
+RSS per session is measured for the session's process and its browsers, from
+the moment the app has loaded to the peak of the session.
+
+Usage:
+    python loadtest.py --sessions 1,4,8 --iterations 2 --depth 3
+    python loadtest.py --sessions 8,16 --mirror   # sessions served from a mirror of the fixture
+"""
+import os
+import sys
+import json
+import time
+import queue
+import random
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+INTERACTIONS = ["load", "search", "filter", "select", "generate"]
+
+# How often the sampler looks at the browser count and RSS, in seconds
+SAMPLE_INTERVAL = 0.2
+
+# Folder levels below the fixture root down to the documents (committee > År > meeting date)
+FIXTURE_DEPTH = 3
+
+EMPTY_SEARCH_ERROR = "Search returned no files"
+
+_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>NetPublicator</title></head>
+<body>
+<div class="np-breadcrumb" id="breadcrumb"></div>
+<div id="folders"></div>
+<div id="documents"></div>
+<script>
+const TREE = %s;
+function link(href, text) {
+  const a = document.createElement("a");
+  a.href = href;
+  a.textContent = text;
+  return a;
+}
+function render() {
+  const hash = location.hash;
+  const id = hash.startsWith("#--chn-") && TREE[hash.slice(7)] ? hash.slice(7) : "root";
+  const base = location.href.split("#")[0];
+  const folderUrl = (folderId) => folderId === "root" ? base : base + "#--chn-" + folderId;
+
+  const path = [];
+  for (let folderId = id; folderId; folderId = TREE[folderId].parent) path.unshift(folderId);
+  const breadcrumb = document.getElementById("breadcrumb");
+  breadcrumb.replaceChildren();
+  path.forEach((folderId, i) => {
+    if (i > 0) {
+      const separator = document.createElement("div");
+      separator.textContent = "❯";
+      breadcrumb.appendChild(separator);
+    }
+    const crumb = document.createElement("div");
+    if (i < path.length - 1) crumb.appendChild(link(folderUrl(folderId), TREE[folderId].name));
+    else crumb.textContent = TREE[folderId].name;
+    breadcrumb.appendChild(crumb);
+  });
+
+  const folders = document.getElementById("folders");
+  folders.replaceChildren(...TREE[id].children.map((childId) => {
+    const row = document.createElement("div");
+    row.appendChild(link(folderUrl(childId), TREE[childId].name));
+    return row;
+  }));
+  const documents = document.getElementById("documents");
+  documents.replaceChildren(...TREE[id].documents.map(([name, hash]) => {
+    const row = document.createElement("div");
+    row.appendChild(link("/document/?hash=" + hash, name));
+    return row;
+  }));
+}
+window.addEventListener("hashchange", render);
+render();
+</script>
+</body></html>
+"""
+
+def build_fixture_tree(committees=3, years=2, meetings=4, documents=5, last_year=None):
+    """
+    Build a NetPublicator-like folder tree: root > committee > "År YYYY" > meeting date > documents
+
+    Returns:
+        Dictionary of folder id -> {'name', 'parent', 'children', 'documents': [[name, hash], ...]}
+    """
+    last_year = last_year or date.today().year - 1
+    tree = {"root": {'name': "Fixture Region", 'parent': None, 'children': [], 'documents': []}}
+
+    def add_folder(parent, name):
+        folder_id = f"{len(tree):05d}"
+        tree[folder_id] = {'name': name, 'parent': parent, 'children': [], 'documents': []}
+        tree[parent]['children'].append(folder_id)
+        return folder_id
+
+    for committee in range(committees):
+        committee_id = add_folder("root", f"Nämnd {committee + 1}")
+        for year in range(last_year - years + 1, last_year + 1):
+            year_id = add_folder(committee_id, f"År {year}")
+            for meeting in range(meetings):
+                meeting_date = date(year, 1, 15) + timedelta(days=meeting * 360 // max(meetings, 1))
+                meeting_id = add_folder(year_id, meeting_date.isoformat())
+                for number in range(documents):
+                    name = "Protokoll" if number == 0 else f"Bilaga {number} - ärende {number + 2}"
+                    tree[meeting_id]['documents'].append([f"{name}.pdf", f"{meeting_id}{number:03d}"])
+    return tree
+
+def fixture_pdf(doc_hash):
+    """Return a small valid PDF document for a document hash"""
+    body = f"%PDF-1.4\n% Fixture document {doc_hash}\n".encode("utf-8") + b"0" * 2048
+    return body + b"\n%%EOF\n"
+
+class FixtureServer:
+    """Local HTTP server that serves a fixture tree the way NetPublicator's reader does"""
+
+    def __init__(self, tree, port=0):
+        page = (_PAGE_TEMPLATE % json.dumps(tree, ensure_ascii=False)).encode("utf-8")
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                self.respond(head_only=True)
+
+            def do_GET(self):
+                self.respond(head_only=False)
+
+            def respond(self, head_only):
+                if self.path.startswith("/reader/"):
+                    body, content_type = page, "text/html; charset=utf-8"
+                elif self.path.startswith("/document/") and "hash=" in self.path:
+                    body, content_type = fixture_pdf(self.path.split("hash=")[1]), "application/pdf"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", f'"{len(body)}"')
+                self.end_headers()
+                if not head_only:
+                    self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/reader/r1"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fixture-server", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class ResourceSampler:
+    """Samples the browsers and RSS of a set of session processes (including their children) in the background"""
+
+    def __init__(self, pids, interval=SAMPLE_INTERVAL):
+        self.pids = list(pids)
+        self.interval = interval
+        self.peak_browsers = 0
+        self.peak_rss = {pid: 0 for pid in self.pids}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            usage = process_tree_usage(self.pids)
+            self.peak_browsers = max(self.peak_browsers, sum(browsers for browsers, _ in usage.values()))
+            for pid, (_, rss) in usage.items():
+                self.peak_rss[pid] = max(self.peak_rss[pid], rss)
+            if self._stop.wait(self.interval):
+                break
+
+def process_tree_usage(pids):
+    """
+    Return {pid: (browsers, rss bytes)} for processes including all their descendants, read from /proc
+
+    Browsers are counted as chromedriver processes, one per Selenium driver.
+    """
+    processes = {}  # pid -> (parent pid, name, rss bytes)
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="utf-8", errors="replace") as f:
+                stat = f.read()
+            with open(f"/proc/{entry}/statm", encoding="utf-8") as f:
+                resident_pages = int(f.read().split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        # The process name is in parentheses and may itself contain spaces
+        name = stat[stat.index("(") + 1:stat.rindex(")")]
+        parent = int(stat[stat.rindex(")") + 2:].split()[1])
+        processes[int(entry)] = (parent, name, resident_pages * os.sysconf("SC_PAGE_SIZE"))
+
+    children = {}
+    for child, (parent, _, _) in processes.items():
+        children.setdefault(parent, []).append(child)
+
+    usage = {}
+    for pid in pids:
+        browsers = 0
+        rss = 0
+        pending = [pid]
+        while pending:
+            current = pending.pop()
+            if current not in processes:
+                continue
+            _, name, process_rss = processes[current]
+            rss += process_rss
+            if name.startswith("chromedriver"):
+                browsers += 1
+            pending.extend(children.get(current, []))
+        usage[pid] = (browsers, rss)
+    return usage
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def run_session(fixture_url, search_depth, iterations, think_time, speed, filter_terms, record, seed=None):
+    """
+    Simulate one user: load the app, search, filter, change the selection and generate the download script
+
+    Args:
+        record: Function called with (interaction, seconds, error or None) after every interaction,
+            and with ("rss_after_load", bytes, None) once the app has loaded
+    """
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+
+    def timed(interaction, app, action=None, check=None):
+        start = time.time()
+        error = None
+        try:
+            if action is not None:
+                action()
+            app.run()
+            if app.exception:
+                error = app.exception[0].value
+            elif check is not None:
+                error = check()
+        except Exception as e:
+            error = str(e)
+        record(interaction, time.time() - start, error)
+        time.sleep(think_time * rng.uniform(0.5, 1.5))
+        return error is None
+
+    for _ in range(iterations):
+        app = AppTest.from_file(APP_PATH, default_timeout=600)
+        if not timed("load", app):
+            continue
+        record("rss_after_load", process_tree_usage([os.getpid()])[os.getpid()][1], None)
+
+        def search():
+            _widget(app.text_input, "Enter NetPublicator URL:").input(fixture_url)
+            _widget(app.selectbox, "Subfolder search depth").select(search_depth)
+            _widget(app.radio, "Control search delay").set_value(speed)
+            app.button(key="FormSubmitter:search_form-🔍 Search for PDFs").click()
+        def search_found_files():
+            if "files" not in app.session_state or not app.session_state["files"]:
+                return f"{EMPTY_SEARCH_ERROR} at depth {search_depth} (fixture documents are {FIXTURE_DEPTH} levels deep)"
+        if not timed("search", app, search, search_found_files):
+            continue
+
+        def filter_files():
+            app.text_input(key="facet_text_input").input(rng.choice(filter_terms))
+            app.button(key="FormSubmitter:facet_filter_form-Remove matching").click()
+        timed("filter", app, filter_files)
+
+        def select_files():
+            checkboxes = [checkbox for checkbox in app.checkbox if checkbox.key and checkbox.key.startswith("select_")]
+            for checkbox in rng.sample(checkboxes, min(5, len(checkboxes))):
+                checkbox.set_value(not checkbox.value)
+        timed("select", app, select_files)
+
+        def generate():
+            slider = _widget(app.select_slider, "Parallel downloads:")
+            slider.set_value(rng.choice([2, 4, 6]))
+        timed("generate", app, generate)
+
+def _session_process(fixture_url, sessions, search_depth, iterations, think_time, speed, filter_terms, seed, events, rate=None):
+    """Run one simulated session in its own process, sending its measurements to the events queue"""
+    from rate_governor import get_governor, MAX_RATE
+
+    # The sessions of one server share its governor, so split the host's budget between them
+    governor = get_governor()
+    if rate:
+        governor.configure(initial_rate=rate / sessions, max_rate=rate / sessions)
+    else:
+        governor.configure(initial_rate=governor.initial_rate / sessions,
+                           min_rate=governor.min_rate / sessions,
+                           max_rate=MAX_RATE / sessions)
+    run_session(fixture_url, search_depth, iterations, think_time, speed, filter_terms,
+                lambda interaction, value, error: events.put((seed, interaction, value, error)), seed)
+
+def _widget(widgets, label):
+    for widget in widgets:
+        if widget.label.startswith(label):
+            return widget
+    raise LookupError(f"No widget labelled {label!r}")
+
+def run_load_step(fixture_url, sessions, search_depth=FIXTURE_DEPTH, iterations=1, think_time=0.5, speed="Turbo (High risk for errors)",
+                  filter_terms=("Bilaga", "Protokoll", "ärende 3"), rate=None):
+    """
+    Run a number of concurrent sessions and measure them
+
+    Returns:
+        Dictionary with per-interaction latency statistics, errors, peak browsers and RSS per session
+    """
+    latencies = {interaction: [] for interaction in INTERACTIONS}
+    errors = []
+    rss_after_load = {}
+
+    def record(seed, interaction, value, error):
+        if interaction == "rss_after_load":
+            rss_after_load.setdefault(seed, value)
+            return
+        latencies[interaction].append(value)
+        if error is not None:
+            errors.append((interaction, error))
+
+    context = multiprocessing.get_context("spawn")
+    events = context.Queue()
+    processes = [context.Process(target=_session_process,
+                                 args=(fixture_url, sessions, search_depth, iterations, think_time, speed,
+                                       list(filter_terms), seed, events, rate),
+                                 name=f"session-{seed}")
+                 for seed in range(sessions)]
+    start = time.time()
+    for process in processes:
+        process.start()
+    sampler = ResourceSampler([process.pid for process in processes]).start()
+
+    # Drain the queue while the sessions run, a full queue would block them at exit
+    while any(process.is_alive() for process in processes):
+        try:
+            record(*events.get(timeout=SAMPLE_INTERVAL))
+        except queue.Empty:
+            pass
+    for process in processes:
+        process.join()
+    duration = time.time() - start
+    sampler.stop()
+    while True:
+        try:
+            record(*events.get_nowait())
+        except queue.Empty:
+            break
+
+    session_rss = [sampler.peak_rss[process.pid] for process in processes]
+    session_growth = [max(0, sampler.peak_rss[process.pid] - rss_after_load[seed])
+                      for seed, process in enumerate(processes) if seed in rss_after_load]
+    return {
+        'sessions': sessions,
+        'duration': duration,
+        'latency': {interaction: {
+            'count': len(values),
+            'p50': percentile(values, 0.5),
+            'p90': percentile(values, 0.9),
+            'p99': percentile(values, 0.99),
+            'max': max(values) if values else None
+        } for interaction, values in latencies.items()},
+        'errors': errors,
+        'peak_browsers': sampler.peak_browsers,
+        'rss_per_session': {
+            'p50': percentile(session_rss, 0.5),
+            'max': max(session_rss, default=0),
+            # Memory added by the search itself (session state and browsers), without the interpreter
+            'growth_p50': percentile(session_growth, 0.5),
+            'growth_max': max(session_growth, default=0)
+        }
+    }
+
+def format_step(step):
+    """Format the result of one load step as a text table"""
+    rss = step['rss_per_session']
+    megabytes = lambda value: f"{(value or 0) / 2 ** 20:.0f} MB"
+    lines = [f"{step['sessions']} sessions, {step['duration']:.1f}s, peak {step['peak_browsers']} browsers, "
+             f"{len(step['errors'])} errors",
+             f"  RSS per session: p50 {megabytes(rss['p50'])}, max {megabytes(rss['max'])} "
+             f"(growth after load: p50 {megabytes(rss['growth_p50'])}, max {megabytes(rss['growth_max'])})",
+             f"  {'interaction':<10} {'count':>5} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}"]
+    for interaction, stats in step['latency'].items():
+        if not stats['count']:
+            continue
+        lines.append(f"  {interaction:<10} {stats['count']:>5} " +
+                     " ".join(f"{stats[key]:>7.2f}s" for key in ("p50", "p90", "p99", "max")))
+    for interaction, error in step['errors'][:5]:
+        lines.append(f"  [ERROR] {interaction}: {error}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the app with concurrent simulated sessions")
+    parser.add_argument("--sessions", default="1,2,4", help="Comma-separated numbers of concurrent sessions, run one after another")
+    parser.add_argument("--iterations", type=int, default=1, help="Search flows per session")
+    parser.add_argument("--depth", type=int, default=FIXTURE_DEPTH, help="Subfolder search depth of each search")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Average pause between interactions in seconds")
+    parser.add_argument("--committees", type=int, default=3)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--meetings", type=int, default=4)
+    parser.add_argument("--documents", type=int, default=5)
+    parser.add_argument("--rate", type=float, default=None, help="Requests per second allowed against the fixture server (default: the governor's limits)")
+    parser.add_argument("--mirror", action="store_true", help="Sync the fixture into a temporary mirror first and serve the sessions from it")
+    parser.add_argument("--json", default=None, help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    tree = build_fixture_tree(args.committees, args.years, args.meetings, args.documents)
+    server = FixtureServer(tree).start()
+    print(f"Fixture server at {server.url} ({len(tree)} folders, "
+          f"{sum(len(folder['documents']) for folder in tree.values())} documents)", file=sys.stderr)
+
+    mirror_dir = None
+    try:
+        if args.mirror:
+            from mirror import Mirror, MIRROR_ENV
+            mirror_dir = tempfile.TemporaryDirectory()
+            settings = Mirror(mirror_dir.name).sync(server.url, search_depth=args.depth, search_delay=0.1)
+            if not settings['files']:
+                raise SystemExit(f"Mirror sync at depth {args.depth} found no files (fixture documents are {FIXTURE_DEPTH} levels deep)")
+            os.environ[MIRROR_ENV] = mirror_dir.name
+
+        steps = []
+        for sessions in [int(value) for value in args.sessions.split(',') if value.strip()]:
+            step = run_load_step(server.url, sessions, args.depth, args.iterations, args.think_time, rate=args.rate)
+            steps.append(step)
+            print(format_step(step))
+            # Without files the later interactions measure nothing, so stop instead of reporting empty numbers
+            empty = [error for interaction, error in step['errors'] if str(error).startswith(EMPTY_SEARCH_ERROR)]
+            if empty:
+                raise SystemExit(f"[ERROR] {empty[0]}")
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(steps, f, indent=1, default=str)
+    finally:
+        server.stop()
+        if mirror_dir is not None:
+            mirror_dir.cleanup()
+
+if __name__ == "__main__":
+    main()
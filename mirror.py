@@ -0,0 +1,444 @@
+"""
+Local mirror of NetPublicator archives.
+
+A mirror directory holds, for every synced root folder, the crawled folder tree
+and its documents, downloaded and verified by download_files together with its
+manifest. Syncs are incremental: documents whose ETag or Last-Modified have not
+changed since the previous sync are not downloaded again. The app answers
+searches, folder expansions and ZIP downloads from the mirror, so only the sync
+contacts the live site.
+
+Usage:
+    python mirror.py --mirror /srv/np-mirror sync https://www.netpublicator.com/reader/r90521909 --depth 3
+    python mirror.py --mirror /srv/np-mirror sync              # re-sync every root, e.g. from cron
+    python mirror.py --mirror /srv/np-mirror sync --every 360  # or keep running and sync every 6 hours
+    NETPUBLICATOR_MIRROR=/srv/np-mirror streamlit run app.py
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from datetime import date
+from downloader import (get_netpublicator_pdf_filenames, get_document_hash, get_folder_depth,
+                        _should_exclude_folder, _folder_matches_date_range, _inherited_dates)
+from prefetch import prefetch_file_metadata, load_metadata_cache, save_metadata_cache
+from verified_download import download_files, load_manifest, update_manifest, MANIFEST_NAME
+from json_store import write_json
+from path_index import split_path
+
+MIRROR_ENV = "NETPUBLICATOR_MIRROR"
+CONFIG_NAME = "mirror.json"
+DEFAULT_DEPTH = 3
+
+def get_mirror():
+    """Return the mirror configured with the NETPUBLICATOR_MIRROR environment variable, or None"""
+    mirror_dir = os.environ.get(MIRROR_ENV)
+    return Mirror(mirror_dir) if mirror_dir else None
+
+class Mirror:
+    """Folder trees and documents of the roots synced into a local directory"""
+
+    def __init__(self, mirror_dir):
+        self.mirror_dir = mirror_dir
+        self._trees = {}  # tree file -> (mtime, _MirrorTree)
+        self._manifests = {}  # documents directory -> (mtime, manifest)
+
+    def roots(self):
+        """Return {root url: settings and results of the last sync} for every synced root"""
+        try:
+            with open(os.path.join(self.mirror_dir, CONFIG_NAME), encoding="utf-8") as f:
+                return json.load(f)['roots']
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def sync(self, root_url, search_depth=None, exclude_folders=None, search_delay=0.7, workers=1, prune=False, progress_callback=None):
+        """
+        Crawl a root folder and download its new and changed documents into the mirror
+
+        Args:
+            root_url: URL of the folder to mirror
+            search_depth: How many levels deep to mirror (default: as in the previous sync, or DEFAULT_DEPTH)
+            exclude_folders: List of words/phrases to exclude from folder names (default: as in the previous sync)
+            search_delay: Time to wait between page loads
+            workers: Number of browsers crawling at the same time
+            prune: Delete mirrored documents that are no longer in the archive
+            progress_callback: Function to call with progress updates
+
+        Returns:
+            Dictionary with the settings and results of this sync
+        """
+        roots = self.roots()
+        settings = roots.get(root_url, {})
+        if search_depth is None:
+            search_depth = settings.get('search_depth', DEFAULT_DEPTH)
+        if exclude_folders is None:
+            exclude_folders = settings.get('exclude_folders', [])
+        root_id = settings.get('id') or _root_id(root_url)
+        start_time = time.time()
+
+        if workers > 1 and search_depth > 0:
+            from distributed_crawl import crawl_distributed
+            result = crawl_distributed(root_url, search_depth, exclude_folders, None, search_delay, workers,
+                                       progress_callback=progress_callback)
+        else:
+            result = get_netpublicator_pdf_filenames(root_url, search_depth > 0, search_depth, exclude_folders, None,
+                                                     search_delay, progress_callback)
+        # Without the root listing the result is empty; replacing the tree (or pruning) would wipe the mirror
+        if result['folder_display_name'] == "error_folder" or any(
+                error['folder'] == "main folder" for error in result['error_folders']):
+            raise RuntimeError(f"Could not load {root_url}, the mirror was left unchanged")
+
+        metadata_path = os.path.join(self.mirror_dir, "metadata.json")
+        metadata = prefetch_file_metadata(result['files'], cache=load_metadata_cache(metadata_path), refresh=True,
+                                          progress_callback=progress_callback)
+        save_metadata_cache(metadata, metadata_path)
+
+        documents_dir = os.path.join(self.mirror_dir, "documents", root_id)
+        download_result = download_files(result['files'], documents_dir, metadata=metadata, progress_callback=progress_callback)
+
+        # Folders that failed this time (503, stale elements) keep their contents from the previous sync
+        tree_path = os.path.join(self.mirror_dir, "trees", f"{root_id}.json")
+        kept = 0
+        if result['error_folders'] and os.path.exists(tree_path):
+            with open(tree_path, encoding="utf-8") as f:
+                kept = _keep_failed_folders(json.load(f), result)
+
+        removed = 0
+        # After a partial crawl, documents missing from the result may just not have been reached
+        prune_skipped = prune and bool(result['error_folders'])
+        if prune and not prune_skipped:
+            current = {get_document_hash(file_url) for _, file_url, _ in result['files']}
+            manifest = load_manifest(documents_dir)
+            stale = [doc_hash for doc_hash in manifest if doc_hash not in current]
+            for doc_hash in stale:
+                path = os.path.join(documents_dir, manifest[doc_hash]['path'])
+                if os.path.exists(path):
+                    os.remove(path)
+            update_manifest(documents_dir, removals=stale)
+            removed = len(stale)
+
+        # The tree is replaced last, so searches never list documents that are still being downloaded
+        write_json(tree_path, result)
+
+        settings.update({
+            'id': root_id,
+            'search_depth': search_depth,
+            'exclude_folders': exclude_folders,
+            'synced_at': time.time(),
+            'sync_seconds': time.time() - start_time,
+            'files': len(result['files']),
+            'downloaded': len(download_result['downloaded']),
+            'unchanged': len(download_result['skipped']),
+            'failed': len(download_result['failed']),
+            'removed': removed,
+            'prune_skipped': prune_skipped,
+            'kept_from_previous_sync': kept
+        })
+        # Re-read the config, another root may have been synced in the meantime
+        roots = self.roots()
+        roots[root_url] = settings
+        write_json(os.path.join(self.mirror_dir, CONFIG_NAME), {'roots': roots})
+        return settings
+
+    def search(self, url, search_depth=0, exclude_folders=None, date_filter=None, folder_path=""):
+        """
+        Answer a search from the mirror
+
+        Args:
+            url: URL of a mirrored root folder or of any folder below it
+            search_depth: How many levels deep to search (below each matching folder if folder_path is given)
+            exclude_folders: List of words/phrases to exclude from folder names
+            date_filter: Tuple of (earliest_date, latest_date) for date filtering
+            folder_path: Only search the folders below url whose path ends with this path
+
+        Returns:
+            Dictionary in the same format as get_netpublicator_pdf_filenames, plus 'mirror_synced_at' and
+            'mirror_complete' (False if the search goes deeper than the mirror), and 'target_folders'
+            if folder_path was given. None if url is not in the mirror.
+        """
+        located = self._locate(url.strip())
+        if located is None:
+            return None
+        settings, tree, prefix = located
+
+        targets = tree.find(prefix, folder_path) if folder_path else [prefix]
+        result = tree.collect(targets, prefix, search_depth, exclude_folders or [],
+                              date_filter or (date(1970, 1, 1), date.today()))
+
+        breadcrumb_links = [tuple(link) for link in tree.result['breadcrumb_links']]
+        for i, name in enumerate(split_path(prefix)):
+            path = "/".join(split_path(prefix)[:i + 1])
+            breadcrumb_links.append((name, tree.folder_urls.get(path)))
+        result.update({
+            'folder_display_name': " > ".join(text for text, _ in breadcrumb_links) or "default_folder",
+            'folder_safe_name': "_".join(text for text, _ in breadcrumb_links) or "default_folder",
+            'breadcrumb_links': breadcrumb_links,
+            'sleep_time': 0,
+            'mirror_synced_at': settings.get('synced_at'),
+            'mirror_complete': all(_depth(target) + search_depth <= settings.get('search_depth', 0) for target in targets)
+        })
+        if folder_path:
+            result['target_folders'] = [_relative(target, prefix) for target in targets]
+        return result
+
+    def expand(self, url, folder_path, exclude_folders=None, date_filter=None):
+        """
+        Answer a folder expansion from the mirror, like expand_netpublicator_folder with search_depth=0
+
+        Args:
+            url: URL of the search the folder was found in
+            folder_path: Path of the folder in that search's result
+
+        Returns:
+            Dictionary in the same format as expand_netpublicator_folder, or None if url is not in the mirror
+        """
+        located = self._locate(url.strip())
+        if located is None:
+            return None
+        _, tree, prefix = located
+        target = f"{prefix}/{folder_path}" if prefix else folder_path
+        result = tree.collect([target], prefix, 0, exclude_folders or [], date_filter or (date(1970, 1, 1), date.today()))
+        result['sleep_time'] = 0
+        return result
+
+    def local_path(self, file_url):
+        """Return the path of a mirrored document, or None if it has not been downloaded"""
+        doc_hash = get_document_hash(file_url)
+        for documents_dir, manifest in self.document_stores():
+            entry = manifest.get(doc_hash)
+            if entry and os.path.exists(os.path.join(documents_dir, entry['path'])):
+                return os.path.join(documents_dir, entry['path'])
+        return None
+
+    def metadata(self):
+        """Return document hash -> manifest entry (size, ETag, Last-Modified) for every mirrored document"""
+        metadata = {}
+        for _, manifest in self.document_stores():
+            metadata.update(manifest)
+        return metadata
+
+    def document_stores(self):
+        """Return (documents directory, manifest) for every synced root"""
+        stores = []
+        for settings in self.roots().values():
+            documents_dir = os.path.join(self.mirror_dir, "documents", settings['id'])
+            manifest_path = os.path.join(documents_dir, MANIFEST_NAME)
+            try:
+                mtime = os.path.getmtime(manifest_path)
+            except OSError:
+                continue
+            cached = self._manifests.get(documents_dir)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, load_manifest(documents_dir))
+                self._manifests[documents_dir] = cached
+            stores.append((documents_dir, cached[1]))
+        return stores
+
+    def _locate(self, url):
+        """Find the synced root containing url and the path of url's folder below it"""
+        for root_url, settings in self.roots().items():
+            tree = self._tree(settings)
+            if tree is None:
+                continue
+            if url == root_url:
+                return settings, tree, ""
+            path = tree.url_paths.get(url)
+            if path is not None:
+                return settings, tree, path
+        return None
+
+    def _tree(self, settings):
+        tree_path = os.path.join(self.mirror_dir, "trees", f"{settings['id']}.json")
+        try:
+            mtime = os.path.getmtime(tree_path)
+        except OSError:
+            return None
+        cached = self._trees.get(tree_path)
+        # A scheduled sync replaces the file, so reload it when it changes
+        if cached is None or cached[0] != mtime:
+            with open(tree_path, encoding="utf-8") as f:
+                cached = (mtime, _MirrorTree(json.load(f)))
+            self._trees[tree_path] = cached
+        return cached[1]
+
+class _MirrorTree:
+    """Crawl result of a synced root, indexed by folder"""
+
+    def __init__(self, result):
+        self.result = result
+        self.files_by_folder = {}
+        for fname, file_url, folder_location in result['files']:
+            folder = "" if folder_location == "current" else folder_location
+            name = fname[len(folder) + 1:] if folder else fname
+            self.files_by_folder.setdefault(folder, []).append((name, file_url))
+
+        # excluded_folder_urls holds every subfolder seen during the crawl, excluded or not
+        self.folder_urls = dict(result['excluded_folder_urls'])
+        self.url_paths = {folder_url: path for path, folder_url in self.folder_urls.items()}
+        self.children = {}
+        for path in self.folder_urls:
+            parent = path.rsplit('/', 1)[0] if '/' in path else ""
+            self.children.setdefault(parent, []).append(path)
+
+    def find(self, prefix, folder_path):
+        """Return the folders below prefix whose path ends with folder_path, without nested matches"""
+        query = "/".join(split_path(folder_path)).lower()
+        matches = []
+        for path in sorted(self.folder_urls, key=_depth):
+            relative = _relative(path, prefix).lower()
+            if path == prefix or (prefix and not path.startswith(f"{prefix}/")):
+                continue
+            if relative != query and not relative.endswith(f"/{query}"):
+                continue
+            if not any(path.startswith(f"{match}/") for match in matches):
+                matches.append(path)
+        return matches
+
+    def collect(self, targets, prefix, search_depth, exclude_folders, date_filter):
+        """Gather files and folders below the targets like a crawl starting at each of them would"""
+        earliest_date, latest_date = date_filter
+        files, subfolders, excluded_folders, excluded_folder_urls = [], [], [], {}
+
+        def walk(path, depth, parent_dates):
+            folder = _relative(path, prefix)
+            for name, file_url in self.files_by_folder.get(path, []):
+                files.append((f"{folder}/{name}" if folder else name, file_url, folder or "current"))
+
+            folders_to_scan = []
+            for child in self.children.get(path, []):
+                child_name = child.rsplit('/', 1)[-1]
+                child_path = _relative(child, prefix)
+                excluded_folder_urls[child_path] = self.folder_urls[child]
+
+                if _should_exclude_folder(child_name, exclude_folders):
+                    excluded_folders.append(f"{child_path} (excluded by keyword)")
+                    continue
+                should_include, inherit_dates = _folder_matches_date_range(child_name, earliest_date, latest_date, parent_dates)
+                if not should_include:
+                    excluded_folders.append(f"{child_path} (excluded by date range)")
+                    continue
+
+                subfolders.append((child_name, self.folder_urls[child], child_path))
+                if depth < search_depth:
+                    folders_to_scan.append((child, inherit_dates))
+
+            # List all subfolders before descending, in the same order as a crawl
+            for child, inherit_dates in folders_to_scan:
+                walk(child, depth + 1, inherit_dates)
+
+        for target in targets:
+            walk(target, 0, _inherited_dates(target))
+
+        error_folders = []
+        for error in self.result['error_folders']:
+            path = "" if error['folder'] == "main folder" else error['folder']
+            if any(path == target or path.startswith(f"{target}/") or not target for target in targets):
+                error_folders.append(dict(error, folder=_relative(path, prefix) or "main folder"))
+
+        return {
+            'files': files,
+            'subfolders': subfolders,
+            'error_folders': error_folders,
+            'excluded_folders': excluded_folders,
+            'excluded_folder_urls': excluded_folder_urls
+        }
+
+def _keep_failed_folders(previous, result):
+    """
+    Copy the files and subfolders of folders that failed to scan from the previous tree into result
+
+    Returns:
+        Number of files kept
+    """
+    failed = [error['folder'] for error in result['error_folders'] if error['folder'] != "main folder"]
+
+    def in_failed(path, include_self):
+        return any(path.startswith(f"{folder}/") or (include_self and path == folder) for folder in failed)
+
+    known_urls = {file_url for _, file_url, _ in result['files']}
+    kept = [entry for entry in previous['files']
+            if in_failed(entry[2], True) and entry[1] not in known_urls]
+    result['files'].extend(tuple(entry) for entry in kept)
+
+    known_folders = {path for _, _, path in result['subfolders']}
+    result['subfolders'].extend(tuple(entry) for entry in previous['subfolders']
+                                if in_failed(entry[2], False) and entry[2] not in known_folders)
+    for path, folder_url in previous['excluded_folder_urls'].items():
+        if in_failed(path, False):
+            result['excluded_folder_urls'].setdefault(path, folder_url)
+
+    for error in result['error_folders']:
+        if error['folder'] != "main folder":
+            error['suggestion'] = "Contents are from the previous sync; sync again to update"
+    return len(kept)
+
+def _relative(path, prefix):
+    """Return a tree path relative to the folder the search started at"""
+    if not prefix:
+        return path
+    return path[len(prefix) + 1:] if path.startswith(f"{prefix}/") else ""
+
+def _depth(path):
+    return get_folder_depth(path) if path else 0
+
+def _root_id(root_url):
+    return hashlib.sha1(root_url.encode("utf-8")).hexdigest()[:16]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep a local mirror of NetPublicator archives")
+    parser.add_argument("--mirror", default=os.environ.get(MIRROR_ENV), help=f"Mirror directory (default: ${MIRROR_ENV})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sync_parser = subparsers.add_parser("sync", help="Sync the given roots, or every root in the mirror")
+    sync_parser.add_argument("urls", nargs="*")
+    sync_parser.add_argument("--depth", type=int, default=None, help=f"Levels to mirror (default: as before, or {DEFAULT_DEPTH})")
+    sync_parser.add_argument("--exclude", default=None, help="Comma-separated folder exclusion terms")
+    sync_parser.add_argument("--delay", type=float, default=0.7)
+    sync_parser.add_argument("--workers", type=int, default=1, help="Parallel browsers for the crawl")
+    sync_parser.add_argument("--prune", action="store_true", help="Delete documents that are no longer in the archive")
+    sync_parser.add_argument("--every", type=float, default=None, help="Keep running and sync every N minutes")
+
+    subparsers.add_parser("list", help="Show the synced roots")
+    args = parser.parse_args(argv)
+
+    if not args.mirror:
+        parser.error(f"give --mirror or set {MIRROR_ENV}")
+    mirror = Mirror(args.mirror)
+
+    if args.command == "list":
+        for root_url, settings in mirror.roots().items():
+            synced = time.strftime("%Y-%m-%d %H:%M", time.localtime(settings['synced_at']))
+            print(f"{root_url}  depth {settings['search_depth']}  {settings['files']} files  synced {synced}")
+        return
+
+    exclusion_list = None
+    if args.exclude is not None:
+        exclusion_list = [term.strip().lower() for term in args.exclude.split(',') if term.strip()]
+
+    while True:
+        for root_url in args.urls or list(mirror.roots()):
+            try:
+                settings = mirror.sync(
+                    root_url,
+                    search_depth=args.depth,
+                    exclude_folders=exclusion_list,
+                    search_delay=args.delay,
+                    workers=args.workers,
+                    prune=args.prune,
+                    progress_callback=lambda current, total, message: print(message, file=sys.stderr)
+                )
+                print(f"[MIRROR] {root_url}: {settings['files']} files, {settings['downloaded']} downloaded, "
+                      f"{settings['unchanged']} unchanged, {settings['failed']} failed, {settings['removed']} removed "
+                      f"({settings['sync_seconds']:.0f}s)")
+                if settings['prune_skipped']:
+                    print(f"[MIRROR] {root_url}: some folders failed, nothing was pruned")
+            except Exception as e:
+                print(f"[MIRROR] {root_url}: sync failed: {e}")
+        if args.every is None:
+            break
+        time.sleep(args.every * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Persistent index of NetPublicator folder paths and their #--chn- URLs.
+
+Every crawl records the folders it has seen, keyed by their full breadcrumb
+path ("Region Dalarna/Regionfullmäktige/År 2024"). A folder whose page was
+loaded is marked as listed, meaning all of its subfolders are in the index.
+Targeted searches use this to start directly at a deep folder, or at the
+folders matching a date range, without loading every ancestor page again.
+Listings older than LISTING_MAX_AGE are loaded again when a search walks
+through them, so new meetings show up.
+"""
+import os
+import time
+import sqlite3
+from datetime import date
+from downloader import _parse_folder_date_range
+from sqlite_store import connect
+
+PATH_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "path_index.sqlite")
+
+# Seconds a folder's list of subfolders is trusted before it is loaded again
+LISTING_MAX_AGE = 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    reader TEXT,
+    path_key TEXT,
+    path TEXT,
+    parent_key TEXT,
+    name TEXT,
+    url TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    listed_at REAL,
+    updated REAL,
+    PRIMARY KEY (reader, path_key)
+);
+CREATE INDEX IF NOT EXISTS folders_parent ON folders (reader, parent_key);
+CREATE INDEX IF NOT EXISTS folders_url ON folders (url);
+"""
+
+def reader_key(url):
+    """Return the reader a folder URL belongs to (the URL without its #--chn- fragment)"""
+    return url.split('#')[0].rstrip('/')
+
+def split_path(folder_path):
+    """Split a folder path written with "/" or " > " separators into folder names"""
+    return [part.strip() for part in folder_path.replace(" > ", "/").split('/') if part.strip()]
+
+def record_crawl(url, listings, breadcrumb_links=None, start_path="", db_path=PATH_INDEX_PATH):
+    """
+    Add the folders seen by a crawl to the index
+
+    Args:
+        url: URL the crawl started at
+        listings: Dictionary of {folder path: (folder url, [(subfolder name, subfolder url), ...])}
+            for every folder whose page was loaded, with paths as used in the crawl result
+        breadcrumb_links: Breadcrumb of the start folder from _get_folder_info, if it was read
+        start_path: Path of the start folder in the crawl result (the path_prefix of an expansion)
+        db_path: Index database
+
+    Returns:
+        Number of folders recorded (0 if the start folder could not be placed in the tree)
+    """
+    reader = reader_key(url)
+    now = time.time()
+    rows = {}
+    listed = set()
+
+    if breadcrumb_links:
+        base_parts = [text for text, _ in breadcrumb_links]
+        # Ancestors from the breadcrumb; the last crumb is the start folder itself
+        for i, (text, link_url) in enumerate(breadcrumb_links[:-1]):
+            if link_url:
+                rows[_key(base_parts[:i + 1])] = (base_parts[:i + 1], link_url)
+    else:
+        known = lookup_url(url, db_path)
+        if known is not None:
+            base_parts = split_path(known['path'])
+        elif "#--chn-" not in url:
+            base_parts = []
+        else:
+            return 0
+    rows[_key(base_parts)] = (base_parts, url)
+
+    start_parts = split_path(start_path)
+    for folder_path, (folder_url, subfolders) in listings.items():
+        parts = split_path("" if folder_path == "current" else folder_path)
+        if parts[:len(start_parts)] != start_parts:
+            continue
+        parts = base_parts + parts[len(start_parts):]
+        rows[_key(parts)] = (parts, folder_url)
+        listed.add(_key(parts))
+        for subfolder_name, subfolder_url in subfolders:
+            rows[_key(parts + [subfolder_name])] = (parts + [subfolder_name], subfolder_url)
+
+    with _connect(db_path) as conn:
+        for key, (parts, folder_url) in rows.items():
+            start_date, end_date = _folder_dates(parts[-1]) if parts else (None, None)
+            conn.execute(
+                """INSERT INTO folders (reader, path_key, path, parent_key, name, url, start_date, end_date, listed_at, updated)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (reader, path_key) DO UPDATE SET
+                       url = excluded.url, listed_at = COALESCE(excluded.listed_at, listed_at), updated = excluded.updated""",
+                (reader, key, "/".join(parts), _key(parts[:-1]), parts[-1] if parts else "",
+                 folder_url, start_date, end_date, now if key in listed else None, now)
+            )
+    return len(rows)
+
+def lookup_url(url, db_path=PATH_INDEX_PATH):
+    """Return the index entry of a folder URL, or None if it is unknown"""
+    with _connect(db_path) as conn:
+        row = conn.execute("SELECT * FROM folders WHERE url = ? AND reader = ? ORDER BY listed_at DESC LIMIT 1",
+                           (url, reader_key(url))).fetchone()
+    return dict(row) if row else None
+
+def is_listed(entry):
+    """Check if the index knows all subfolders of an entry from a recent enough crawl"""
+    return entry['listed_at'] is not None and time.time() - entry['listed_at'] < LISTING_MAX_AGE
+
+def get_children(entry, db_path=PATH_INDEX_PATH):
+    """Return the index entries of the known subfolders of an entry"""
+    with _connect(db_path) as conn:
+        rows = conn.execute("SELECT * FROM folders WHERE reader = ? AND parent_key = ? ORDER BY path_key",
+                            (entry['reader'], entry['path_key'])).fetchall()
+    return [dict(row) for row in rows]
+
+def find_folders(start, folder_path, db_path=PATH_INDEX_PATH):
+    """
+    Find indexed folders below start whose path ends with folder_path
+
+    Args:
+        start: Index entry of the folder to search below
+        folder_path: Folder path such as "Regionfullmäktige/År 2024/2024-06-12" (case-insensitive)
+
+    Returns:
+        Matching index entries, shallowest first
+    """
+    query_key = _key(split_path(folder_path))
+    if not query_key:
+        return [start]
+    below = f"{start['path_key']}/" if start['path_key'] else ""
+    with _connect(db_path) as conn:
+        rows = conn.execute(
+            """SELECT * FROM folders WHERE reader = ? AND substr(path_key, 1, ?) = ?
+               AND (path_key = ? OR substr(path_key, -?) = ?)
+               ORDER BY length(path_key)""",
+            (start['reader'], len(below), below, below + query_key, len(query_key) + 1, "/" + query_key)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+def resolve_path(start, folder_path, list_folder=None, db_path=PATH_INDEX_PATH):
+    """
+    Find the folders a folder path refers to, loading as few folder pages as possible
+
+    Folders anywhere below start whose path ends with folder_path are used directly. Otherwise
+    the path is followed name by name from start, calling list_folder(entry) for folders whose
+    subfolders are not (or no longer) known.
+
+    Returns:
+        Matching index entries (empty if the path does not exist)
+    """
+    matches = find_folders(start, folder_path, db_path)
+    if matches:
+        return matches
+
+    entry = start
+    for name in split_path(folder_path):
+        if not is_listed(entry) and list_folder is not None:
+            list_folder(entry)
+        children = {child['name'].lower(): child for child in get_children(entry, db_path)}
+        entry = children.get(name.lower())
+        if entry is None:
+            return []
+    return [entry]
+
+def plan_date_targets(start, earliest_date, latest_date, list_folder=None, max_depth=5, db_path=PATH_INDEX_PATH):
+    """
+    Choose the folders a date-range search has to crawl, using the index instead of ancestor pages
+
+    The tree below start is walked in the index. Dated folders outside the range are pruned like in
+    a normal crawl, and the walk stops at folders whose dates lie entirely inside the range. Folders
+    whose subfolders are not (or no longer) known are listed with list_folder(entry), a single page
+    load, and become crawl targets themselves if that is not possible.
+
+    Args:
+        start: Index entry of the folder the search starts at
+        earliest_date, latest_date: Date range of the search
+        list_folder: Function that loads a folder page and records its subfolders in the index
+        max_depth: Levels below start the walk may go before a folder is crawled instead
+
+    Returns:
+        List of index entries to crawl
+    """
+    targets = []
+    pending = [(start, 0)]
+    while pending:
+        entry, depth = pending.pop(0)
+        if entry['start_date'] is not None:
+            folder_start = date.fromisoformat(entry['start_date'])
+            folder_end = date.fromisoformat(entry['end_date'])
+            if folder_end < earliest_date or folder_start > latest_date:
+                continue
+            if earliest_date <= folder_start and folder_end <= latest_date:
+                targets.append(entry)
+                continue
+        if not is_listed(entry) and list_folder is not None and depth < max_depth:
+            list_folder(entry)
+            entry = lookup_url(entry['url'], db_path) or entry
+        if is_listed(entry) and depth < max_depth:
+            pending.extend((child, depth + 1) for child in get_children(entry, db_path))
+        else:
+            targets.append(entry)
+    return targets
+
+def get_breadcrumb(entry, db_path=PATH_INDEX_PATH):
+    """Return [(folder name, url), ...] from the top of the reader down to entry, like _get_folder_info"""
+    parts = split_path(entry['path'])
+    keys = [_key(parts[:i + 1]) for i in range(len(parts))]
+    with _connect(db_path) as conn:
+        urls = {row['path_key']: row['url'] for row in conn.execute(
+            f"SELECT path_key, url FROM folders WHERE reader = ? AND path_key IN ({', '.join('?' * len(keys))})",
+            [entry['reader']] + keys)}
+    return [(name, urls.get(key)) for name, key in zip(parts, keys)]
+
+def relative_path(entry, start):
+    """Return the path of an entry relative to the start folder, as used in crawl results"""
+    parts = split_path(entry['path'])
+    start_parts = split_path(start['path'])
+    return "/".join(parts[len(start_parts):])
+
+def index_stats(db_path=PATH_INDEX_PATH):
+    """Return (folders, listed folders) in the index"""
+    if not os.path.exists(db_path):
+        return 0, 0
+    with _connect(db_path) as conn:
+        return tuple(conn.execute("SELECT COUNT(*), COUNT(listed_at) FROM folders").fetchone())
+
+def _folder_dates(folder_name):
+    folder_dates = _parse_folder_date_range(folder_name)
+    if folder_dates is None:
+        return None, None
+    return folder_dates[0].isoformat(), folder_dates[1].isoformat()
+
+def _key(parts):
+    return "/".join(part.lower() for part in parts)
+
+def _connect(db_path):
+    return connect(db_path, _SCHEMA, row_factory=sqlite3.Row)
@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from downloader import get_document_hash
+from rate_governor import get_governor
+from json_store import write_json, file_lock
+
+METADATA_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "document_metadata.json")
+
+# Seconds a cached size/ETag is trusted before the document is checked again
+METADATA_MAX_AGE = 3600
+
+_thread_local = threading.local()
+
+def prefetch_file_metadata(files, max_workers=8, cache=None, refresh=False, max_age=METADATA_MAX_AGE, timeout=15, progress_callback=None):
+    """
+    Collect size, content type and Last-Modified/ETag for documents without downloading them
+
+    Args:
+        files: List of (filename, url, folder_location) tuples as returned by get_netpublicator_pdf_filenames
+        max_workers: Number of concurrent HEAD/ranged GET requests
+        cache: Dictionary of document hash -> metadata from an earlier prefetch
+        refresh: Re-request documents that are already in the cache
+        max_age: Re-request cached documents checked more than this many seconds ago
+        timeout: Request timeout in seconds
+        progress_callback: Function to call with progress updates
+
+    Returns:
+        Dictionary of document hash -> metadata dictionary
+    """
+    metadata = dict(cache) if cache else {}
+
+    pending = {}
+    oldest = time.time() - max_age
+    for _, file_url, _ in files:
+        doc_hash = get_document_hash(file_url)
+        if refresh or doc_hash not in metadata or metadata[doc_hash].get('fetched_at', 0) < oldest:
+            pending[doc_hash] = file_url
+
+    if not pending:
+        return metadata
+
+    completed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch_document_metadata, file_url, timeout): doc_hash
+                   for doc_hash, file_url in pending.items()}
+        for future in as_completed(futures):
+            metadata[futures[future]] = future.result()
+            completed += 1
+            if progress_callback:
+                progress_callback(completed, len(pending), f"Checked {completed}/{len(pending)} files")
+
+    return metadata
+
+def fetch_document_metadata(file_url, timeout=15):
+    """Fetch metadata for one document with a HEAD request, falling back to a one-byte ranged GET"""
+    import requests
+
+    session = _get_session()
+    governor = get_governor()
+    info = {
+        'url': file_url,
+        'size': None,
+        'content_type': None,
+        'last_modified': None,
+        'etag': None,
+        'status': None,
+        'error': None,
+        'fetched_at': time.time()
+    }
+
+    try:
+        with governor.lease(file_url) as lease:
+            response = session.head(file_url, allow_redirects=True, timeout=timeout)
+            lease.status = response.status_code
+        size = _parse_int(response.headers.get('Content-Length'))
+
+        # Some servers refuse HEAD or leave out the length, so ask for the first byte instead
+        if response.status_code >= 400 or size is None:
+            response.close()
+            with governor.lease(file_url) as lease:
+                response = session.get(file_url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=timeout)
+                lease.status = response.status_code
+            size = _size_from_ranged_response(response)
+            response.close()
+
+        info['status'] = response.status_code
+        info['size'] = size
+        info['content_type'] = response.headers.get('Content-Type')
+        info['last_modified'] = response.headers.get('Last-Modified')
+        info['etag'] = response.headers.get('ETag')
+    except requests.RequestException as e:
+        info['error'] = str(e)
+
+    return info
+
+def is_unchanged(previous, current):
+    """Check if a document is unchanged between two metadata snapshots"""
+    if not previous or not current or previous.get('error') or current.get('error'):
+        return False
+    if previous.get('etag') and current.get('etag'):
+        return previous['etag'] == current['etag']
+    if previous.get('last_modified') and current.get('last_modified'):
+        return (previous['last_modified'] == current['last_modified'] and
+                previous.get('size') == current.get('size'))
+    return False
+
+def summarize_by_folder(files, metadata):
+    """
+    Sum document sizes per folder
+
+    Returns:
+        Dictionary of folder_location -> {'files': count, 'known': count with a size, 'bytes': total size}
+    """
+    totals = {}
+    for _, file_url, folder_location in files:
+        folder_total = totals.setdefault(folder_location, {'files': 0, 'known': 0, 'bytes': 0})
+        folder_total['files'] += 1
+        size = metadata.get(get_document_hash(file_url), {}).get('size')
+        if size is not None:
+            folder_total['known'] += 1
+            folder_total['bytes'] += size
+    return totals
+
+def format_size(num_bytes):
+    """Format a byte count for display"""
+    size = float(num_bytes)
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def load_metadata_cache(path=METADATA_CACHE_PATH):
+    """Load cached document metadata from disk"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_metadata_cache(metadata, path=METADATA_CACHE_PATH):
+    """
+    Merge document metadata into the cache on disk, keeping the most recently fetched entry per document
+
+    Other sessions may have saved newer entries since metadata was loaded, so the file is never overwritten as a whole.
+
+    Returns:
+        The merged cache
+    """
+    with file_lock(path):
+        merged = load_metadata_cache(path)
+        for doc_hash, entry in metadata.items():
+            current = merged.get(doc_hash)
+            if current is None or entry.get('fetched_at', 0) >= current.get('fetched_at', 0):
+                merged[doc_hash] = entry
+        write_json(path, merged)
+    return merged
+
+def _get_session():
+    """Return a requests session for the current worker thread"""
+    if not hasattr(_thread_local, "session"):
+        import requests
+        _thread_local.session = requests.Session()
+    return _thread_local.session
+
+def _size_from_ranged_response(response):
+    """Get the full document size from a ranged GET response"""
+    content_range = response.headers.get('Content-Range', '')
+    if '/' in content_range:
+        total = _parse_int(content_range.rsplit('/', 1)[1])
+        if total is not None:
+            return total
+    # Server ignored the Range header and answered with the full document
+    if response.status_code == 200:
+        return _parse_int(response.headers.get('Content-Length'))
+    return None
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,194 @@
+"""
+Opt-in sampling profiler for crawls and app render passes.
+
+The profiler samples the stack of one thread at a fixed interval and reports
+collapsed stacks (input for flamegraph.pl, speedscope or inferno) and a top-N
+hot-function summary. Work that the profiled thread hands to a helper thread
+is followed when the helper runs it inside follow_thread(); its stacks appear
+under a "[thread name]" root frame. When disabled, profile() does nothing at all.
+
+Usage:
+    python profiler.py URL --depth 2 --out crawl_profile
+    flamegraph.pl crawl_profile.collapsed > crawl_profile.svg
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from contextlib import contextmanager
+
+DEFAULT_INTERVAL = 0.005
+
+# Profilers currently sampling, so follow_thread can find the ones watching a parent thread
+_running = []
+_running_guard = threading.Lock()
+
+class SamplingProfiler:
+    """Samples the call stack of one thread (and the threads following it) from a background thread"""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.followed = {}  # thread id -> root label of a helper thread sampled along with thread_id
+        self.stacks = {}  # tuple of frame labels (outermost first) -> sample count
+        self.samples = 0
+        self.duration = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_time = None
+
+    def start(self):
+        self._start_time = time.time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        with _running_guard:
+            _running.append(self)
+
+    def stop(self):
+        with _running_guard:
+            if self in _running:
+                _running.remove(self)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.time() - self._start_time
+
+    def _run(self):
+        labels = {}  # code object -> label, so each function is formatted once
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            sampled = False
+            for thread_id, root in [(self.thread_id, None)] + list(self.followed.items()):
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                        labels[code] = label
+                    stack.append(label)
+                    frame = frame.f_back
+                if root is not None:
+                    stack.append(root)
+                stack.reverse()
+                key = tuple(stack)
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+                sampled = True
+            if sampled:
+                self.samples += 1
+
+    def collapsed(self):
+        """Return the samples in collapsed stack format ("outer;inner;leaf count" per line)"""
+        lines = []
+        for stack, count in sorted(self.stacks.items()):
+            # Semicolons separate frames in the collapsed format
+            lines.append(";".join(label.replace(";", ",") for label in stack) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+    def top_functions(self, n=20):
+        """
+        Return the n functions with the most samples
+
+        Returns:
+            List of (label, self_samples, total_samples) sorted by total samples
+        """
+        self_samples = {}
+        total_samples = {}
+        for stack, count in self.stacks.items():
+            self_samples[stack[-1]] = self_samples.get(stack[-1], 0) + count
+            # Count recursive functions once per sample
+            for label in set(stack):
+                total_samples[label] = total_samples.get(label, 0) + count
+        ranked = sorted(total_samples, key=lambda label: (total_samples[label], self_samples.get(label, 0)), reverse=True)
+        return [(label, self_samples.get(label, 0), total_samples[label]) for label in ranked[:n]]
+
+    def format_report(self, n=20):
+        """Return the top-N summary as text"""
+        lines = [f"{self.samples} samples over {self.duration:.2f}s (every {self.interval * 1000:.0f} ms)",
+                 f"{'total %':>8} {'self %':>8}  function"]
+        for label, own, total in self.top_functions(n):
+            lines.append(f"{100 * total / max(self.samples, 1):7.1f}% {100 * own / max(self.samples, 1):7.1f}%  {label}")
+        return "\n".join(lines)
+
+@contextmanager
+def follow_thread(parent_id):
+    """
+    Sample the current thread in every running profiler that samples parent_id, while the block runs
+
+    For helper threads that take over work from a profiled thread (see progress.run_with_progress).
+    """
+    thread_id = threading.get_ident()
+    root = f"[{threading.current_thread().name}]"
+    with _running_guard:
+        profilers = [profiler for profiler in _running if profiler.thread_id == parent_id]
+    for profiler in profilers:
+        profiler.followed = {**profiler.followed, thread_id: root}
+    try:
+        yield
+    finally:
+        for profiler in profilers:
+            profiler.followed = {key: value for key, value in profiler.followed.items() if key != thread_id}
+
+@contextmanager
+def profile(enabled=True, interval=DEFAULT_INTERVAL, output_prefix=None):
+    """
+    Profile the current thread while the block runs
+
+    Args:
+        enabled: When False nothing is sampled and None is yielded
+        interval: Time between samples in seconds
+        output_prefix: If set, write <prefix>.collapsed and <prefix>.txt when the block ends
+
+    Yields:
+        The SamplingProfiler (None when disabled)
+    """
+    if not enabled:
+        yield None
+        return
+
+    profiler = SamplingProfiler(interval)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        if output_prefix:
+            with open(output_prefix + ".collapsed", "w", encoding="utf-8") as f:
+                f.write(profiler.collapsed())
+            with open(output_prefix + ".txt", "w", encoding="utf-8") as f:
+                f.write(profiler.format_report() + "\n")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile a NetPublicator crawl")
+    parser.add_argument("url")
+    parser.add_argument("--depth", type=int, default=1)
+    parser.add_argument("--delay", type=float, default=0.7)
+    parser.add_argument("--exclude", default="", help="Comma-separated folder exclusion terms")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="Seconds between samples")
+    parser.add_argument("--top", type=int, default=25, help="Number of functions in the summary")
+    parser.add_argument("--out", default="crawl_profile", help="Output prefix for .collapsed and .txt files")
+    args = parser.parse_args(argv)
+
+    from downloader import get_netpublicator_pdf_filenames
+
+    exclusion_list = [term.strip().lower() for term in args.exclude.split(',') if term.strip()]
+    with profile(interval=args.interval, output_prefix=args.out) as profiler:
+        result = get_netpublicator_pdf_filenames(
+            args.url,
+            include_subfolders=args.depth > 0,
+            search_depth=args.depth,
+            exclude_folders=exclusion_list,
+            search_delay=args.delay,
+            progress_callback=lambda current, total, message: print(message, file=sys.stderr)
+        )
+
+    print(f"Found {len(result['files'])} files")
+    print(profiler.format_report(args.top))
+    print(f"Wrote {args.out}.collapsed and {args.out}.txt")
+
+if __name__ == "__main__":
+    main()
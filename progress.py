@@ -0,0 +1,284 @@
+"""
+Typed crawl progress events and coalescing sinks.
+
+Crawlers emit events to a ProgressBus, which keeps a running snapshot
+(folders scanned, discovered frontier, files found, ETA). The remaining work
+is estimated from the frontier at each depth and the average number of
+subfolders seen per folder at that depth; the ETA is that estimate times the
+measured per-folder latency. Sinks only ever see the latest snapshot: ThrottledSink calls a UI callback at most a few times per
+second, QueueSink hands snapshots to another thread without ever blocking the
+crawler. UI cost therefore depends on crawl duration, not on crawl size.
+
+ThrottledSink runs its callback on the crawling thread, so a slow callback
+still delays the crawl (by at most one call per interval). run_with_progress
+runs the crawl in a background thread behind a QueueSink instead, so the
+crawl never waits for the UI at all; the app uses it for every search.
+"""
+import time
+import queue
+import threading
+from dataclasses import dataclass
+from profiler import follow_thread
+
+@dataclass
+class CrawlStarted:
+    url: str
+    max_depth: int
+    roots: int = 1  # Folders the crawl starts from (several for targeted searches)
+
+@dataclass
+class StatusMessage:
+    text: str
+    fraction: float = None
+    final: bool = False
+
+@dataclass
+class FolderStarted:
+    path: str
+    depth: int
+
+@dataclass
+class FolderScanned:
+    path: str
+    depth: int
+    file_count: int
+    subfolders_queued: int
+
+@dataclass
+class FolderFailed:
+    path: str
+    depth: int
+    error: str
+
+@dataclass
+class FolderSkipped:
+    path: str
+    depth: int
+
+@dataclass
+class CrawlFinished:
+    file_count: int
+    error_count: int
+    excluded_count: int
+    max_depth: int
+
+@dataclass
+class ProgressSnapshot:
+    fraction: float
+    message: str
+    folders_scanned: int
+    frontier: int
+    files_found: int
+    errors: int
+    eta_seconds: float
+    finished: bool
+
+class ProgressBus:
+    """Folds progress events into a snapshot and offers it to the sinks"""
+
+    # Weight of the newest folder in the per-folder latency average
+    LATENCY_SMOOTHING = 0.3
+
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+        self.folders_scanned = 0
+        self.max_depth = 0
+        self.frontier_by_depth = {}  # depth -> folders queued but not scanned yet
+        self.branching = {}  # depth -> [subfolders queued, folders scanned]
+        self.files_found = 0
+        self.errors = 0
+        self.fraction = 0.0
+        self.message = ""
+        self.finished = False
+        self.folder_latency = None
+        self._folder_started = None
+        self._last_finished = None
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def emit(self, event):
+        """Record an event and pass the new snapshot on to the sinks"""
+        now = time.time()
+
+        if isinstance(event, CrawlStarted):
+            self.max_depth = event.max_depth
+            self.frontier_by_depth = {0: event.roots}
+            self._last_finished = now
+            self.message = "Scanning main folder..."
+        elif isinstance(event, StatusMessage):
+            self.message = event.text
+            if event.fraction is not None:
+                self.fraction = event.fraction
+            if event.final:
+                self.finished = True
+        elif isinstance(event, FolderStarted):
+            self._folder_started = now
+            self.message = f"Files found: {self.files_found} - Scanning: {event.path}" if event.path else f"Files found: {self.files_found} - Scanning main folder..."
+        elif isinstance(event, (FolderScanned, FolderFailed)):
+            self.folders_scanned += 1
+            self._dequeue(event.depth)
+            # Without FolderStarted (e.g. parallel workers reported by a coordinator) the time
+            # between finished folders is the effective per-folder latency
+            started = self._folder_started if self._folder_started is not None else self._last_finished
+            if started is not None:
+                latency = now - started
+                if self.folder_latency is None:
+                    self.folder_latency = latency
+                else:
+                    self.folder_latency += self.LATENCY_SMOOTHING * (latency - self.folder_latency)
+                self._folder_started = None
+            self._last_finished = now
+            if isinstance(event, FolderScanned):
+                self.files_found += event.file_count
+                stats = self.branching.setdefault(event.depth, [0, 0])
+                stats[0] += event.subfolders_queued
+                stats[1] += 1
+                if event.subfolders_queued:
+                    self.frontier_by_depth[event.depth + 1] = self.frontier_by_depth.get(event.depth + 1, 0) + event.subfolders_queued
+                where = event.path if event.path else "main folder"
+                if event.file_count:
+                    self.message = f"Found {event.file_count} files in: {where} (Total: {self.files_found})"
+                else:
+                    self.message = f"No files in: {where} (Total: {self.files_found})"
+            else:
+                self.errors += 1
+                self.message = f"Error scanning: {event.path} (Total: {self.files_found})"
+            # Never move the bar backwards when deeper folders turn up
+            self.fraction = max(self.fraction, self.folders_scanned / (self.folders_scanned + self.estimated_remaining()))
+        elif isinstance(event, FolderSkipped):
+            self._dequeue(event.depth)
+        elif isinstance(event, CrawlFinished):
+            self.finished = True
+            self.frontier_by_depth = {}
+            self.fraction = 1.0
+            excluded_info = f" ({event.excluded_count} folders excluded)" if event.excluded_count else ""
+            if event.error_count:
+                self.message = f"Scan complete! Found {event.file_count} files across {event.max_depth} levels ({event.error_count} folders had errors{excluded_info})"
+            else:
+                self.message = f"Scan complete! Found {event.file_count} files across {event.max_depth} levels{excluded_info}"
+
+        if self.sinks:
+            snapshot = self.snapshot()
+            for sink in self.sinks:
+                sink.offer(snapshot)
+
+    def estimated_remaining(self):
+        """Estimate how many folders are left: the frontier plus the subtrees expected below it"""
+        # Depths not seen yet use the branching factor of the nearest shallower depth
+        branching_by_depth = []
+        branching = 0.0
+        for depth in range(self.max_depth):
+            queued, scanned = self.branching.get(depth, (0, 0))
+            if scanned:
+                branching = queued / scanned
+            branching_by_depth.append(branching)
+
+        subtree_size = {self.max_depth: 1.0}
+        for depth in range(self.max_depth - 1, -1, -1):
+            subtree_size[depth] = 1.0 + branching_by_depth[depth] * subtree_size[depth + 1]
+        return sum(count * subtree_size.get(depth, 1.0) for depth, count in self.frontier_by_depth.items())
+
+    def snapshot(self):
+        frontier = sum(self.frontier_by_depth.values())
+        eta = None
+        if self.folder_latency is not None and not self.finished:
+            eta = self.estimated_remaining() * self.folder_latency
+        return ProgressSnapshot(self.fraction, self.message, self.folders_scanned, frontier,
+                                self.files_found, self.errors, eta, self.finished)
+
+    def _dequeue(self, depth):
+        if self.frontier_by_depth.get(depth):
+            self.frontier_by_depth[depth] -= 1
+
+class ThrottledSink:
+    """Passes at most one snapshot per interval to a callback; the final snapshot always gets through"""
+
+    def __init__(self, callback, min_interval=0.25):
+        self.callback = callback
+        self.min_interval = min_interval
+        self._last_delivery = 0
+
+    def offer(self, snapshot):
+        now = time.time()
+        if snapshot.finished or now - self._last_delivery >= self.min_interval:
+            self._last_delivery = now
+            self.callback(snapshot)
+
+class QueueSink:
+    """Hands snapshots to a consumer thread, dropping stale ones instead of blocking the producer"""
+
+    def __init__(self, maxsize=1):
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def offer(self, snapshot):
+        while True:
+            try:
+                self.queue.put_nowait(snapshot)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+def legacy_callback_sink(progress_callback, min_interval=0.25):
+    """Wrap a progress_callback(current, total, message) function as a throttled sink"""
+    def deliver(snapshot):
+        progress_callback(round(snapshot.fraction * 100), 100, format_snapshot(snapshot))
+    return ThrottledSink(deliver, min_interval)
+
+def run_with_progress(work, render, poll_interval=0.25):
+    """
+    Run work in a background thread and render its progress from the calling thread
+
+    Args:
+        work: Function called with a QueueSink to pass on to the crawler as a progress sink
+        render: Function called with the latest ProgressSnapshot, on the calling thread
+        poll_interval: Longest time between two renders while snapshots keep coming
+
+    Returns:
+        The return value of work (its exception is raised here)
+    """
+    sink = QueueSink()
+    outcome = {}
+    parent_id = threading.get_ident()
+
+    def run():
+        try:
+            # A profiler sampling the caller keeps sampling the work it handed to this thread
+            with follow_thread(parent_id):
+                outcome['result'] = work(sink)
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run, name="progress-work", daemon=True)
+    thread.start()
+    while thread.is_alive():
+        try:
+            render(sink.queue.get(timeout=poll_interval))
+        except queue.Empty:
+            pass
+    try:
+        render(sink.queue.get_nowait())
+    except queue.Empty:
+        pass
+
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome.get('result')
+
+def format_snapshot(snapshot):
+    """Return the message of a snapshot with the time left, if known"""
+    message = snapshot.message
+    if snapshot.eta_seconds is not None and snapshot.frontier:
+        message += f" - about {format_eta(snapshot.eta_seconds)} left"
+    return message
+
+def format_eta(seconds):
+    """Format a remaining time estimate for display"""
+    if seconds < 60:
+        return f"{max(1, round(seconds))}s"
+    if seconds < 3600:
+        return f"{round(seconds / 60)} min"
+    return f"{seconds / 3600:.1f} h"
@@ -0,0 +1,120 @@
+import time
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# Requests per second per host
+INITIAL_RATE = 2.0
+MIN_RATE = 0.2
+MAX_RATE = 6.0
+BURST = 2.0
+
+# Responses slower than this (seconds) count as a sign of an overloaded host
+SLOW_RESPONSE = 5.0
+
+OVERLOAD_STATUSES = (429, 502, 503, 504)
+
+class RateGovernor:
+    """
+    Token bucket per host with adaptive limits
+
+    The rate is halved whenever a host answers with 503/429, fails or responds
+    slowly, and grows by a small step for every healthy response.
+    """
+
+    def __init__(self, initial_rate=INITIAL_RATE, min_rate=MIN_RATE, max_rate=MAX_RATE, burst=BURST, slow_response=SLOW_RESPONSE):
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.slow_response = slow_response
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def configure(self, initial_rate=None, min_rate=None, max_rate=None):
+        """Change the limits, e.g. to share a host's budget between several processes"""
+        with self._lock:
+            if min_rate is not None:
+                self.min_rate = min_rate
+            if max_rate is not None:
+                self.max_rate = max_rate
+            if initial_rate is not None:
+                self.initial_rate = initial_rate
+            for state in self._hosts.values():
+                state['rate'] = min(max(state['rate'], self.min_rate), self.max_rate)
+
+    def acquire(self, url):
+        """Block until a request to the host of url is allowed"""
+        host = _host(url)
+        while True:
+            with self._lock:
+                state = self._refill(host)
+                if state['tokens'] >= 1:
+                    state['tokens'] -= 1
+                    return
+                wait = (1 - state['tokens']) / state['rate']
+            time.sleep(wait)
+
+    def report(self, url, status=None, elapsed=None, failed=False):
+        """Adjust the host's rate after a response"""
+        host = _host(url)
+        with self._lock:
+            state = self._refill(host)
+            overloaded = failed or status in OVERLOAD_STATUSES or (elapsed is not None and elapsed > self.slow_response)
+            if overloaded:
+                state['rate'] = max(self.min_rate, state['rate'] / 2)
+                state['tokens'] = min(state['tokens'], 0)
+                state['overloads'] += 1
+            else:
+                state['rate'] = min(self.max_rate, state['rate'] + 0.05 * self.initial_rate)
+
+    @contextmanager
+    def lease(self, url):
+        """
+        Wait for permission to make one request and report its outcome afterwards
+
+        Set lease.status inside the block when the response status is known.
+        """
+        self.acquire(url)
+        lease = _Lease()
+        start = time.time()
+        try:
+            yield lease
+        except BaseException:
+            self.report(url, lease.status, time.time() - start, failed=lease.status is None)
+            raise
+        self.report(url, lease.status, time.time() - start, failed=lease.failed)
+
+    def current_rate(self, url):
+        """Return the current requests-per-second limit for the host of url"""
+        with self._lock:
+            return self._refill(_host(url))['rate']
+
+    def stats(self):
+        """Return {host: {'rate': ..., 'overloads': ...}} for display"""
+        with self._lock:
+            return {host: {'rate': state['rate'], 'overloads': state['overloads']} for host, state in self._hosts.items()}
+
+    def _refill(self, host):
+        now = time.monotonic()
+        state = self._hosts.get(host)
+        if state is None:
+            state = {'rate': self.initial_rate, 'tokens': self.burst, 'updated': now, 'overloads': 0}
+            self._hosts[host] = state
+        state['tokens'] = min(self.burst, state['tokens'] + (now - state['updated']) * state['rate'])
+        state['updated'] = now
+        return state
+
+class _Lease:
+    def __init__(self):
+        self.status = None
+        self.failed = False
+
+_governor = RateGovernor()
+
+def get_governor():
+    """Return the process-wide rate governor shared by all crawlers and downloaders"""
+    return _governor
+
+def _host(url):
+    return urlparse(url).netloc.lower() or url
@@ -0,0 +1,203 @@
+import os
+import re
+import json
+import bisect
+from concurrent.futures import ProcessPoolExecutor
+from json_store import write_json, file_lock
+
+SEARCH_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "search_index.json")
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+class FilenameIndex:
+    """Trigram index for fast substring matching on filenames"""
+
+    def __init__(self, filenames=()):
+        self.filenames = []
+        self.lowered = []
+        self.trigrams = {}
+        for fname in filenames:
+            self.add(fname)
+
+    def add(self, fname):
+        position = len(self.filenames)
+        lowered = fname.lower()
+        self.filenames.append(fname)
+        self.lowered.append(lowered)
+        for trigram in _trigrams(lowered):
+            self.trigrams.setdefault(trigram, set()).add(position)
+
+    def search(self, text):
+        """Return the filenames containing text (case-insensitive)"""
+        text = text.lower()
+        if not text:
+            return []
+
+        if len(text) < 3:
+            candidates = range(len(self.filenames))
+        else:
+            # Intersect posting lists from the rarest trigram up, then confirm the match
+            postings = sorted((self.trigrams.get(trigram, set()) for trigram in _trigrams(text)), key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates &= posting
+                if not candidates:
+                    break
+            candidates = sorted(candidates)
+
+        return [self.filenames[i] for i in candidates if text in self.lowered[i]]
+
+class ContentIndex:
+    """Inverted index over the text of downloaded documents, keyed by document hash"""
+
+    def __init__(self):
+        self.postings = {}  # term -> set of document hashes
+        self.documents = {}  # document hash -> {'version': ..., 'terms': [...]}
+        self._sorted_terms = None
+        self._changes = {}  # document hash -> new entry (None if removed) since the index was loaded
+
+    def needs_update(self, doc_hash, version):
+        entry = self.documents.get(doc_hash)
+        return entry is None or entry['version'] != version
+
+    def update_document(self, doc_hash, version, text):
+        """Add or replace the indexed text for one document"""
+        self.remove_document(doc_hash)
+        entry = {'version': version, 'terms': sorted(set(tokenize(text)))}
+        self._add_entry(doc_hash, entry)
+        self._changes[doc_hash] = entry
+
+    def remove_document(self, doc_hash):
+        entry = self.documents.pop(doc_hash, None)
+        if not entry:
+            return
+        self._sorted_terms = None
+        self._changes[doc_hash] = None
+        for term in entry['terms']:
+            docs = self.postings.get(term)
+            if docs:
+                docs.discard(doc_hash)
+                if not docs:
+                    del self.postings[term]
+
+    def search(self, query):
+        """Return the hashes of documents containing every word of query (word prefixes match too)"""
+        terms = tokenize(query)
+        if not terms:
+            return set()
+
+        result = None
+        for term in terms:
+            matches = set(self.postings.get(term, ()))
+            # Allow "beslut" to match "beslutet", "beslutade" etc.
+            if len(term) >= 4:
+                for indexed_term in self._terms_with_prefix(term):
+                    matches |= self.postings[indexed_term]
+            result = matches if result is None else result & matches
+            if not result:
+                return set()
+        return result
+
+    def _terms_with_prefix(self, prefix):
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self.postings)
+        position = bisect.bisect_left(self._sorted_terms, prefix)
+        while position < len(self._sorted_terms) and self._sorted_terms[position].startswith(prefix):
+            yield self._sorted_terms[position]
+            position += 1
+
+    def _add_entry(self, doc_hash, entry):
+        self._sorted_terms = None
+        for term in entry['terms']:
+            self.postings.setdefault(term, set()).add(doc_hash)
+        self.documents[doc_hash] = entry
+
+    def to_dict(self):
+        return {'documents': self.documents}
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls()
+        for doc_hash, entry in data.get('documents', {}).items():
+            index._add_entry(doc_hash, entry)
+        return index
+
+def tokenize(text):
+    """Split text into lowercase search terms"""
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if len(token) > 1]
+
+def update_content_index(index, documents_dir, manifest, max_workers=None, progress_callback=None):
+    """
+    Extract text from new or changed PDFs in a process pool and update the index incrementally
+
+    Args:
+        index: ContentIndex to update
+        documents_dir: Directory the documents were downloaded to
+        manifest: Download manifest (document hash -> {'path', 'size', 'etag', ...})
+        max_workers: Number of extraction processes (defaults to the CPU count)
+        progress_callback: Function to call with progress updates
+
+    Returns:
+        Number of documents (re)indexed
+    """
+    pending = []
+    for doc_hash, entry in manifest.items():
+        version = entry.get('etag') or f"{entry.get('size')}:{entry.get('last_modified')}"
+        if index.needs_update(doc_hash, version):
+            pending.append((doc_hash, version, os.path.join(documents_dir, entry['path'])))
+
+    # Drop documents that are no longer in the download directory
+    for doc_hash in list(index.documents):
+        if doc_hash not in manifest:
+            index.remove_document(doc_hash)
+
+    if not pending:
+        return 0
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        paths = [path for _, _, path in pending]
+        for done, ((doc_hash, version, _), text) in enumerate(zip(pending, executor.map(extract_pdf_text, paths, chunksize=8)), 1):
+            index.update_document(doc_hash, version, text)
+            if progress_callback:
+                progress_callback(done, len(pending), f"Indexed {done}/{len(pending)} documents")
+
+    return len(pending)
+
+def extract_pdf_text(path):
+    """Extract the text of a PDF file (runs in a worker process)"""
+    from pypdf import PdfReader
+
+    try:
+        reader = PdfReader(path)
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+    except Exception as e:
+        print(f"[INDEX] Could not extract text from {path}: {e}")
+        return ""
+
+def load_content_index(path=SEARCH_INDEX_PATH):
+    """Load the content index from disk"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return ContentIndex.from_dict(json.load(f))
+    except (OSError, ValueError):
+        return ContentIndex()
+
+def save_content_index(index, path=SEARCH_INDEX_PATH):
+    """
+    Merge the documents indexed or removed since index was loaded into the index on disk
+
+    Returns:
+        The merged ContentIndex, including documents other sessions indexed in the meantime
+    """
+    with file_lock(path):
+        merged = load_content_index(path)
+        for doc_hash, entry in index._changes.items():
+            merged.remove_document(doc_hash)
+            if entry is not None:
+                merged._add_entry(doc_hash, entry)
+        write_json(path, merged.to_dict())
+    merged._changes = {}
+    return merged
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
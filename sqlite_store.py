@@ -0,0 +1,61 @@
+"""
+SQLite connection helper shared by the path index, the document catalog and
+the distributed crawl queue.
+
+Every store opens its database in WAL mode with a generous busy timeout, so
+several app sessions, CLI runs and crawl workers can use the same file.
+"""
+import os
+import sqlite3
+
+class Connection:
+    """
+    sqlite3 connection that commits (or rolls back) and closes at the end of a with block
+
+    With immediate=True the block runs as one BEGIN IMMEDIATE transaction, which
+    takes the write lock up front. Read-then-update steps such as claiming a
+    queued task then cannot interleave with another process.
+    """
+
+    def __init__(self, conn, immediate=False):
+        self.conn = conn
+        self.immediate = immediate
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def __enter__(self):
+        if self.immediate:
+            self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
+        self.conn.close()
+
+def connect(db_path, schema=None, row_factory=None, immediate=False):
+    """
+    Open db_path (creating its directory and schema) and return a Connection
+
+    Args:
+        db_path: Database file
+        schema: SQL script run on every open, typically CREATE ... IF NOT EXISTS statements
+        row_factory: Optional sqlite3 row factory, e.g. sqlite3.Row
+        immediate: Manage transactions explicitly and start each with block with BEGIN IMMEDIATE
+    """
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if immediate:
+        conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    else:
+        conn = sqlite3.connect(db_path, timeout=60)
+    if row_factory is not None:
+        conn.row_factory = row_factory
+    conn.execute("PRAGMA journal_mode=WAL")
+    if schema:
+        conn.executescript(schema)
+    return Connection(conn, immediate)
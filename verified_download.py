@@ -0,0 +1,351 @@
+import os
+import re
+import json
+import time
+import uuid
+import heapq
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from downloader import get_document_hash
+from prefetch import is_unchanged
+from rate_governor import get_governor
+from json_store import write_json, file_lock
+
+MANIFEST_NAME = ".manifest.json"
+DOCUMENT_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "documents")
+
+# Limits of the app's shared document store; least recently used documents are evicted first
+DOCUMENT_STORE_MAX_BYTES = 2 * 1024 ** 3
+DOCUMENT_STORE_MAX_AGE = 30 * 24 * 3600
+
+_thread_local = threading.local()
+
+def verify_pdf_file(path, expected_length=None):
+    """
+    Check that a downloaded file is a complete PDF document
+
+    Args:
+        path: Path to the downloaded file
+        expected_length: Size announced by the server, if known
+
+    Returns:
+        Tuple of (is_valid, reason)
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        head = f.read(1024)
+        f.seek(max(0, size - 1024))
+        tail = f.read()
+    return verify_pdf_bytes(head, tail, size, expected_length)
+
+def verify_pdf_bytes(head, tail, size, expected_length=None):
+    """
+    Check the first and last bytes of a document for PDF structure
+
+    Args:
+        head: First (up to 1024) bytes of the document
+        tail: Last (up to 1024) bytes of the document
+        size: Total document size in bytes
+        expected_length: Size announced by the server, if known
+
+    Returns:
+        Tuple of (is_valid, reason)
+    """
+    if size == 0:
+        return False, "Empty file"
+
+    head_lower = head.lstrip().lower()
+    if head_lower.startswith((b"<!doctype", b"<html", b"<?xml", b"<head", b"<body")):
+        return False, "HTML error page instead of PDF"
+
+    # The PDF header must appear within the first 1024 bytes
+    if b"%PDF-" not in head:
+        return False, "Missing PDF header"
+
+    if expected_length is not None and size != expected_length:
+        return False, f"Truncated ({size} of {expected_length} bytes)"
+
+    if b"%%EOF" not in tail:
+        return False, "Truncated (missing %%EOF trailer)"
+
+    return True, "OK"
+
+def download_files(files, dest_dir, max_workers=4, verify_workers=2, max_retries=5, retry_delay=2.0, metadata=None, timeout=60, progress_callback=None):
+    """
+    Download documents, verify each one and requeue failures with backoff
+
+    Args:
+        files: List of (filename, url, folder_location) tuples as returned by get_netpublicator_pdf_filenames
+        dest_dir: Directory to save the files in; each document is stored once under its hash (see store_name)
+        max_workers: Number of concurrent downloads
+        verify_workers: Number of threads verifying finished downloads
+        max_retries: How many times a failed document is requeued
+        retry_delay: Base delay in seconds, doubled for each retry
+        metadata: Current prefetch metadata (document hash -> metadata); documents unchanged
+            since the previous run into dest_dir are skipped
+        timeout: Request timeout in seconds
+        progress_callback: Function to call with progress updates
+
+    Returns:
+        Dictionary with downloaded, skipped and failed documents and the number of retries
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    manifest = load_manifest(dest_dir)
+    metadata = metadata or {}
+    # Only this run's entries are merged into the manifest, other sessions may be downloading into dest_dir too
+    updates = {}
+    part_paths = {}
+    # Document hash -> every name it was requested under; a document listed in several folders is fetched once
+    names = {}
+
+    downloaded = []
+    skipped = []
+    failed = []
+    retries = 0
+
+    ready = []
+    for fname, file_url, folder_location in files:
+        doc_hash = get_document_hash(file_url)
+        if doc_hash in names:
+            names[doc_hash].append(fname)
+            if doc_hash not in part_paths:
+                skipped.append(fname)
+            continue
+        names[doc_hash] = [fname]
+        previous = manifest.get(doc_hash)
+        # Entries from before documents were stored by hash may point at a file another document overwrote
+        if (previous and previous['path'] == store_name(doc_hash) and
+                os.path.exists(os.path.join(dest_dir, previous['path'])) and
+                is_unchanged(previous, metadata.get(doc_hash))):
+            skipped.append(fname)
+            updates[doc_hash] = dict(previous, used_at=time.time())
+            continue
+        # A unique part file per run, so two sessions fetching the same document do not write into one file
+        part_paths[doc_hash] = os.path.join(dest_dir, store_name(doc_hash)) + f".{uuid.uuid4().hex[:12]}.part"
+        ready.append((fname, file_url, doc_hash, 0))
+
+    total = sum(len(names[item[2]]) for item in ready)
+    delayed = []  # heap of (ready_time, sequence, item)
+    sequence = 0
+
+    def report():
+        if progress_callback:
+            finished = len(downloaded) + len(failed)
+            message = f"Downloaded {len(downloaded)}/{total} files"
+            if retries:
+                message += f" ({retries} retries)"
+            progress_callback(finished, total, message)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as download_pool, \
+            ThreadPoolExecutor(max_workers=verify_workers) as verify_pool:
+        active = {}
+        while ready or delayed or active:
+            now = time.time()
+            while delayed and delayed[0][0] <= now:
+                ready.append(heapq.heappop(delayed)[2])
+
+            # Keep the download pool full without queueing the whole batch up front
+            downloads_active = sum(1 for stage, _ in active.values() if stage == "download")
+            while ready and downloads_active < max_workers:
+                item = ready.pop(0)
+                part_path = part_paths[item[2]]
+                future = download_pool.submit(_download_to_file, item[1], part_path, timeout)
+                active[future] = ("download", item)
+                downloads_active += 1
+
+            if not active:
+                time.sleep(max(0, delayed[0][0] - time.time()))
+                continue
+
+            wait_timeout = max(0, delayed[0][0] - time.time()) if delayed else None
+            done, _ = wait(active, timeout=wait_timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                stage, item = active.pop(future)
+                fname, file_url, doc_hash, attempt = item[:4]
+                part_path = part_paths[doc_hash]
+
+                if stage == "download":
+                    try:
+                        headers = future.result()
+                    except Exception as e:
+                        ok, reason, headers = False, str(e), {}
+                    else:
+                        expected = _expected_length(headers) or metadata.get(doc_hash, {}).get('size')
+                        active[verify_pool.submit(verify_pdf_file, part_path, expected)] = ("verify", (fname, file_url, doc_hash, attempt, headers))
+                        continue
+                else:
+                    headers = item[4]
+                    try:
+                        ok, reason = future.result()
+                    except OSError as e:
+                        ok, reason = False, str(e)
+
+                if ok:
+                    final_path = os.path.join(dest_dir, store_name(doc_hash))
+                    os.replace(part_path, final_path)
+                    updates[doc_hash] = {
+                        'path': store_name(doc_hash),
+                        'url': file_url,
+                        'size': os.path.getsize(final_path),
+                        'etag': headers.get('ETag'),
+                        'last_modified': headers.get('Last-Modified'),
+                        'downloaded_at': time.time(),
+                        'used_at': time.time()
+                    }
+                    downloaded.extend(names[doc_hash])
+                elif attempt < max_retries:
+                    if reason.startswith("HTML error page"):
+                        # NetPublicator sends its 503 page with status 200, so tell the governor here
+                        get_governor().report(file_url, 503)
+                    retries += 1
+                    sequence += 1
+                    heapq.heappush(delayed, (time.time() + retry_delay * 2 ** attempt, sequence, (fname, file_url, doc_hash, attempt + 1)))
+                    print(f"[RETRY] {fname}: {reason} (attempt {attempt + 1}/{max_retries})")
+                else:
+                    if os.path.exists(part_path):
+                        os.remove(part_path)
+                    failed.extend({
+                        "file": name,
+                        "url": file_url,
+                        "reason": reason,
+                        "attempts": attempt + 1
+                    } for name in names[doc_hash])
+                report()
+
+    update_manifest(dest_dir, updates)
+
+    return {
+        'downloaded': downloaded,
+        'skipped': skipped,
+        'failed': failed,
+        'retries': retries
+    }
+
+def load_manifest(dest_dir):
+    """Load the manifest of previously downloaded documents in dest_dir"""
+    try:
+        with open(os.path.join(dest_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(dest_dir, manifest):
+    """Save the manifest of downloaded documents in dest_dir (use update_manifest while others may write to it)"""
+    write_json(os.path.join(dest_dir, MANIFEST_NAME), manifest, indent=1)
+
+def update_manifest(dest_dir, updates=None, removals=()):
+    """
+    Merge entries into the manifest on disk while holding its lock
+
+    Args:
+        updates: Dictionary of document hash -> manifest entry to add or replace
+        removals: Document hashes to drop
+
+    Returns:
+        The merged manifest
+    """
+    with _manifest_lock(dest_dir):
+        manifest = load_manifest(dest_dir)
+        manifest.update(updates or {})
+        for doc_hash in removals:
+            manifest.pop(doc_hash, None)
+        save_manifest(dest_dir, manifest)
+    return manifest
+
+def evict_documents(dest_dir, max_bytes=DOCUMENT_STORE_MAX_BYTES, max_age=DOCUMENT_STORE_MAX_AGE, keep=()):
+    """
+    Delete the least recently used documents until the store is within its size and age limits
+
+    Args:
+        dest_dir: Document store directory
+        max_bytes: Total size the store may keep
+        max_age: Seconds after which an unused document is deleted
+        keep: Document hashes that must stay (e.g. the ones just packed into a ZIP)
+
+    Returns:
+        Number of documents deleted
+    """
+    now = time.time()
+    with _manifest_lock(dest_dir):
+        manifest = load_manifest(dest_dir)
+        total = sum(entry.get('size') or 0 for entry in manifest.values())
+        evicted = []
+        for doc_hash, entry in sorted(manifest.items(), key=lambda item: item[1].get('used_at') or item[1].get('downloaded_at') or 0):
+            last_used = entry.get('used_at') or entry.get('downloaded_at') or 0
+            if doc_hash in keep or (total <= max_bytes and now - last_used <= max_age):
+                continue
+            path = os.path.join(dest_dir, entry['path'])
+            if os.path.exists(path):
+                os.remove(path)
+            total -= entry.get('size') or 0
+            evicted.append(doc_hash)
+        for doc_hash in evicted:
+            del manifest[doc_hash]
+        if evicted:
+            save_manifest(dest_dir, manifest)
+
+    # Part files left behind by downloads that were interrupted
+    for root, _, names in os.walk(dest_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            if name.endswith((".part", ".tmp")) and now - os.path.getmtime(path) > 24 * 3600:
+                os.remove(path)
+    return len(evicted)
+
+def _manifest_lock(dest_dir):
+    """Serialize manifest updates between threads, and between processes where fcntl is available"""
+    return file_lock(os.path.join(dest_dir, MANIFEST_NAME))
+
+def _download_to_file(file_url, path, timeout):
+    """Stream one document to path and return the response headers"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # The lease covers the wait for the response headers, not the transfer of the body
+    with get_governor().lease(file_url) as lease:
+        response = _get_session().get(file_url, stream=True, timeout=timeout)
+        lease.status = response.status_code
+    with response:
+        response.raise_for_status()
+        with open(path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                f.write(chunk)
+        return response.headers
+
+def _expected_length(headers):
+    """Return Content-Length unless the body was transfer-encoded"""
+    if headers.get('Content-Encoding'):
+        return None
+    try:
+        return int(headers.get('Content-Length'))
+    except (TypeError, ValueError):
+        return None
+
+def store_name(doc_hash):
+    """Return the file name a document is stored under, derived from its hash only"""
+    if not re.fullmatch(r"[\w-]{1,100}", doc_hash):
+        # Documents without a hash= parameter are keyed by their URL
+        doc_hash = hashlib.sha1(doc_hash.encode("utf-8")).hexdigest()
+    return f"{doc_hash}.pdf"
+
+def archive_name(fname):
+    """Turn a "folder/sub/file" display name into a safe relative path for a ZIP entry"""
+    parts = []
+    for part in fname.split('/'):
+        part = part.strip()
+        for char in '<>:"\\|?*':
+            part = part.replace(char, "_")
+        if part and part not in (".", ".."):
+            parts.append(part)
+    if not parts:
+        parts = ["document"]
+    if not parts[-1].lower().endswith(".pdf"):
+        parts[-1] += ".pdf"
+    return "/".join(parts)
+
+def _get_session():
+    """Return a requests session for the current worker thread"""
+    if not hasattr(_thread_local, "session"):
+        import requests
+        _thread_local.session = requests.Session()
+    return _thread_local.session